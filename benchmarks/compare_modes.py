@@ -0,0 +1,147 @@
+"""
+Compare two-pass and single-pass grading over a corpus of Scala files.
+
+For every file, both modes are run against the live API (caches bypassed) and
+the harness reports latency, prompt/completion tokens and whether the two modes
+agree on the grade and on pass/fail.
+
+Usage:
+    python benchmarks/compare_modes.py [--model gpt-4o] [--repeat 1] [--output out.json] [paths...]
+
+Paths default to the examples/ directory.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from invsc.batch import collect_sources  # noqa: E402
+from invsc.config import ALL_GRADES, PASSING_GRADES, OPENAI_API_KEY, OPENAI_MODEL  # noqa: E402
+from invsc.gpt_client import query_gpt, query_gpt_single, GPTError  # noqa: E402
+from invsc.session import get_client  # noqa: E402
+
+
+MODES = {
+    "two-pass": query_gpt,
+    "single-pass": query_gpt_single,
+}
+
+
+class RecordingClient:
+    """Wraps an OpenAI client and tallies the token usage of every completion."""
+
+    def __init__(self, client):
+        self._client = client
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def _create(self, **kwargs):
+        response = self._client.chat.completions.create(**kwargs)
+        self.requests += 1
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.prompt_tokens += usage.prompt_tokens or 0
+            self.completion_tokens += usage.completion_tokens or 0
+        return response
+
+
+def run_mode(mode: str, source_code: str, client: RecordingClient, model: str) -> dict:
+    client.reset()
+    start = time.perf_counter()
+    try:
+        result = MODES[mode](source_code, model=model, client=client, use_cache=False)
+        grade, error = result["grade"], None
+    except GPTError as e:
+        grade, error = None, str(e)
+    return {
+        "grade": grade,
+        "error": error,
+        "seconds": round(time.perf_counter() - start, 3),
+        "requests": client.requests,
+        "prompt_tokens": client.prompt_tokens,
+        "completion_tokens": client.completion_tokens,
+    }
+
+
+def summarise(rows: list[dict]) -> dict:
+    summary = {}
+    for mode in MODES:
+        runs = [r[mode] for r in rows]
+        summary[mode] = {
+            "mean_seconds": round(statistics.mean(r["seconds"] for r in runs), 3),
+            "median_seconds": round(statistics.median(r["seconds"] for r in runs), 3),
+            "prompt_tokens": sum(r["prompt_tokens"] for r in runs),
+            "completion_tokens": sum(r["completion_tokens"] for r in runs),
+            "errors": sum(1 for r in runs if r["error"]),
+        }
+
+    graded = [r for r in rows if all(r[m]["grade"] for m in MODES)]
+    if graded:
+        a, b = MODES
+        summary["agreement"] = {
+            "compared": len(graded),
+            "same_grade": round(sum(r[a]["grade"] == r[b]["grade"] for r in graded) / len(graded), 3),
+            "same_pass_fail": round(sum((r[a]["grade"] in PASSING_GRADES) == (r[b]["grade"] in PASSING_GRADES)
+                                        for r in graded) / len(graded), 3),
+            "mean_grade_distance": round(statistics.mean(
+                abs(ALL_GRADES.index(r[a]["grade"]) - ALL_GRADES.index(r[b]["grade"])) for r in graded
+            ), 3),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two-pass and single-pass grading.")
+    parser.add_argument("paths", nargs="*", default=[str(ROOT / "examples")])
+    parser.add_argument("--model", default=OPENAI_MODEL)
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per file and mode")
+    parser.add_argument("--output", type=Path, default=None, help="Write the raw results as JSON")
+    args = parser.parse_args()
+
+    key = args.api_key or OPENAI_API_KEY
+    if not key:
+        sys.exit("compare_modes: set OPENAI_API_KEY or pass --api-key")
+    client = RecordingClient(get_client(key))
+
+    rows = []
+    for path in collect_sources(args.paths):
+        source_code = path.read_text(encoding="utf-8")
+        for _ in range(args.repeat):
+            row = {"file": str(path.relative_to(ROOT) if path.is_relative_to(ROOT) else path)}
+            for mode in MODES:
+                row[mode] = run_mode(mode, source_code, client, args.model)
+            rows.append(row)
+            a, b = (row[m] for m in MODES)
+            print(f"{row['file']:<32} "
+                  f"two-pass {a['grade'] or 'ERROR':<10} {a['seconds']:>6.1f}s "
+                  f"{a['prompt_tokens']:>6}+{a['completion_tokens']:<5} tok | "
+                  f"single-pass {b['grade'] or 'ERROR':<10} {b['seconds']:>6.1f}s "
+                  f"{b['prompt_tokens']:>6}+{b['completion_tokens']:<5} tok", flush=True)
+
+    if not rows:
+        sys.exit("compare_modes: no .scala files found")
+
+    summary = summarise(rows)
+    print()
+    print(json.dumps(summary, indent=2))
+
+    if args.output:
+        args.output.write_text(json.dumps({"model": args.model, "rows": rows, "summary": summary},
+                                          indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Offline load and soak test of the grading pipeline against the simulated backend.
+
+Synthetic submissions (distinct, so caches don't hide the work) are graded
+concurrently with the same thread pool, rate limiter and retry logic that
+batch mode uses, but every request goes to backends.SimulatedBackend with the
+given latency distribution and fault rates. The harness reports throughput,
+per-file latency percentiles, failures and the requests/tokens spent.
+
+Usage:
+    python benchmarks/load_test.py [--files 200] [--jobs 16] [--latency lognormal:1:0.5]
+                                   [--error-rate 0.02] [--rate-limit-rate 0.05]
+                                   [--duration SECONDS] [--rpm 500] [--tpm 30000] [--output out.json]
+                                   [--endpoints 4 --capacity 8]
+
+With --duration, batches of --files are graded back to back until the time
+is up (a soak test); otherwise one batch is graded. Requests are not rate
+limited unless --rpm or --tpm is given. With --endpoints, the
+requests are spread over that many simulated endpoints by the router (see
+router.py), each taking at most --capacity at a time and with --rpm/--tpm
+as its own limits, and the router's view of every endpoint is added to the
+results.
+"""
+
+import argparse
+import contextvars
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+TEMPLATE = """object Submission{n} {{
+  def sum(a: Array[Int]): Int = {{
+    var s = 0; var i = 0
+    // Invariant: s = sum(a[0..i)) and 0 <= i <= a.length
+    // Variant: a.length - i
+    while (i < a.length) {{ s += a(i) * {n}; i += 1 }}
+    s
+  }}
+}}
+"""
+
+
+# The run measures the pipeline, not the limiter, unless --rpm/--tpm ask for it
+UNLIMITED = 1e12
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test grading against the simulated backend.")
+    parser.add_argument("--files", type=int, default=200, help="Submissions per batch")
+    parser.add_argument("--jobs", type=int, default=16, help="Submissions graded at once")
+    parser.add_argument("--latency", default="lognormal:1:0.5", help="Simulated request latency")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Fraction of requests failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.05, help="Fraction of requests failing with 429")
+    parser.add_argument("--retry-after", type=float, default=1, help="Retry-After sent with simulated 429s")
+    parser.add_argument("--duration", type=float, default=None, help="Keep grading batches for this many seconds")
+    parser.add_argument("--rpm", type=float, default=UNLIMITED,
+                        help="Requests per minute allowed, to test throttling (default: unlimited)")
+    parser.add_argument("--tpm", type=float, default=UNLIMITED,
+                        help="Tokens per minute allowed, to test throttling (default: unlimited)")
+    parser.add_argument("--endpoints", type=int, default=1, help="Simulated endpoints behind the router")
+    parser.add_argument("--capacity", type=int, default=8, help="Requests in flight per endpoint")
+    parser.add_argument("--single-pass", action="store_true")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", type=Path, default=None, help="Write the results as JSON")
+    args = parser.parse_args()
+
+    # The limiter reads its configuration at import time
+    os.environ["INVSC_RPM"] = str(args.rpm)
+    os.environ["INVSC_TPM"] = str(args.tpm)
+
+    from invsc.backends import SimulatedBackend
+    from invsc.gpt_client import GPTError
+    from invsc.grader import grade_source
+    from invsc.metrics import Metrics, activate
+    from invsc.ratelimit import lift_limits
+    from invsc.router import Endpoint, Router
+
+    backends = [
+        SimulatedBackend(latency=args.latency, error_rate=args.error_rate,
+                         rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+                         seed=None if args.seed is None else args.seed + i)
+        for i in range(max(1, args.endpoints))
+    ]
+    if len(backends) == 1:
+        backend = backends[0]
+    else:
+        # --rpm and --tpm become each endpoint's own limits, as in router.py
+        backend = Router([Endpoint(f"sim-{i}", b, capacity=args.capacity, rpm=args.rpm, tpm=args.tpm)
+                          for i, b in enumerate(backends)])
+        lift_limits()
+    metrics = Metrics()
+    activate(metrics)
+
+    def grade(n: int) -> tuple[float, str | None]:
+        start = time.perf_counter()
+        try:
+            grade_source(TEMPLATE.format(n=n), client=backend, use_cache=False,
+                         single_pass=args.single_pass)
+            return time.perf_counter() - start, None
+        except GPTError as e:
+            return time.perf_counter() - start, str(e)
+
+    latencies, failures = [], []
+    start = time.perf_counter()
+    batch = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        while True:
+            numbers = range(batch * args.files, (batch + 1) * args.files)
+            # Each request still reports to this run's metrics
+            futures = [pool.submit(contextvars.copy_context().run, grade, n) for n in numbers]
+            for future in futures:
+                seconds, error = future.result()
+                latencies.append(seconds)
+                if error is not None:
+                    failures.append(error)
+            batch += 1
+            elapsed = time.perf_counter() - start
+            print(f"batch {batch}: {len(latencies)} graded, {len(failures)} failed, "
+                  f"{len(latencies) / elapsed:.2f} files/s", flush=True)
+            if args.duration is None or elapsed >= args.duration:
+                break
+
+    elapsed = time.perf_counter() - start
+    usage = metrics.as_dict()
+    summary = {
+        "files": len(latencies),
+        "failed": len(failures),
+        "seconds": round(elapsed, 3),
+        "files_per_second": round(len(latencies) / elapsed, 3),
+        "latency_p50": round(statistics.median(latencies), 3),
+        "latency_p95": round(percentile(latencies, 0.95), 3),
+        "latency_max": round(max(latencies), 3),
+        "requests": {purpose: r["requests"] for purpose, r in usage["requests"].items()},
+        "prompt_tokens": usage["prompt_tokens"],
+        "completion_tokens": usage["completion_tokens"],
+        "failures": sorted(set(failures))[:10],
+    }
+    if isinstance(backend, Router):
+        summary["endpoints"] = backend.stats()
+    print()
+    print(json.dumps(summary, indent=2))
+
+    if args.output:
+        args.output.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
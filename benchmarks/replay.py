@@ -0,0 +1,287 @@
+"""
+Replay benchmark over the examples/ corpus.
+
+Every file in examples/ has a cassette in benchmarks/cassettes/ holding the
+completions recorded for it. Replaying them takes the network out of the
+picture, so the suite measures only INVSC's own cost, per file:
+
+  end_to_end_ms   grade_source (pre-check, sharding, prompts, parsing) plus
+                  format_full_output, with the cassette standing in for the API
+  parse_us        parse_verdict + normalisation of the recorded verdict
+  format_us       format_full_output alone
+  peak_kib        peak memory allocated during one end-to-end run
+
+plus the CLI's time to first output for --help (see startup.py).
+
+Results are written as JSON. Given --baseline, every metric is compared
+with the stored one and the script exits non-zero if any got slower (or
+bigger) by more than --threshold. Baselines are only comparable on the same
+machine; on shared or virtualised hosts, where timings can swing by 2x from
+one minute to the next, raise --threshold accordingly.
+
+Usage:
+    python benchmarks/replay.py [--repeat 20] [--output results.json]
+                                [--baseline benchmarks/baseline.json] [--threshold 0.25]
+    python benchmarks/replay.py --record [--model gpt-4o]   # re-record the cassettes
+
+Recording goes through the configured backend (INVSC_BACKEND); each
+cassette notes which backend produced it. The cassettes shipped here are
+fixtures ("backend": "fixture") written to the length and shape of real
+gpt-4o answers: a full step-by-step analysis and a verdict with several
+warnings. Re-record them with the API for real ones. A file the pre-check
+settles without asking the model is recorded, and replayed, with the
+pre-check off, so that every cassette exercises the model path.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import timeit
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from invsc import ratelimit  # noqa: E402
+from invsc.batch import collect_sources  # noqa: E402
+from invsc.config import LLM_BACKEND, OPENAI_API_KEY, OPENAI_MODEL  # noqa: E402
+from invsc.formatter import format_full_output  # noqa: E402
+from invsc.gpt_client import parse_verdict  # noqa: E402
+from invsc.grader import grade_source  # noqa: E402
+from invsc.session import get_client, needs_api_key  # noqa: E402
+from startup import first_output  # noqa: E402
+
+CASSETTES = Path(__file__).resolve().parent / "cassettes"
+
+# Smaller is better for every metric
+METRICS = ("end_to_end_ms", "parse_us", "format_us", "peak_kib")
+
+# Differences below these are timer and allocator noise, whatever the ratio
+NOISE = {"end_to_end_ms": 0.5, "parse_us": 2, "format_us": 5, "peak_kib": 4, "startup_ms": 30}
+
+
+def request_key(messages: list[dict]) -> str:
+    return hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def request_kind(kwargs: dict) -> str:
+    response_format = kwargs.get("response_format")
+    if response_format is None:
+        return "analysis"
+    return "single-pass" if response_format.get("type") == "json_schema" else "judgement"
+
+
+def completion(content: str, usage: dict | None):
+    message = SimpleNamespace(content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)],
+                           usage=SimpleNamespace(**usage) if usage else None)
+
+
+class Recorder:
+    """Wraps a backend and keeps every completion it returns."""
+
+    def __init__(self, client):
+        self._client = client
+        self.interactions = []
+        self.lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        response = self._client.chat.completions.create(**kwargs)
+        usage = getattr(response, "usage", None)
+        with self.lock:
+            self.interactions.append({
+                "key": request_key(kwargs["messages"]),
+                "kind": request_kind(kwargs),
+                "content": response.choices[0].message.content,
+                "usage": {"prompt_tokens": usage.prompt_tokens,
+                          "completion_tokens": usage.completion_tokens} if usage else None,
+            })
+        return response
+
+
+class Cassette:
+    """
+    Answers requests from a recording. A request is matched on its exact
+    messages; if the prompts have changed since recording, the next unused
+    answer of the same kind is used instead and counted as stale.
+    """
+
+    def __init__(self, interactions: list[dict]):
+        self.interactions = interactions
+        self.lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.rewind()
+
+    def rewind(self):
+        self.used = set()
+        self.stale = 0
+
+    def _create(self, **kwargs):
+        key, kind = request_key(kwargs["messages"]), request_kind(kwargs)
+        with self.lock:
+            match = next((i for i, r in enumerate(self.interactions)
+                          if i not in self.used and r["key"] == key), None)
+            if match is None:
+                match = next((i for i, r in enumerate(self.interactions)
+                              if i not in self.used and r["kind"] == kind), None)
+                self.stale += 1
+            if match is None:
+                raise RuntimeError(f"cassette has no {kind} response left; re-record with --record")
+            self.used.add(match)
+            recorded = self.interactions[match]
+        return completion(recorded["content"], recorded["usage"])
+
+
+def record(paths: list[Path], model: str, api_key: str | None):
+    key = api_key or OPENAI_API_KEY
+    if needs_api_key() and not key:
+        sys.exit("replay: recording needs OPENAI_API_KEY or --api-key (or INVSC_BACKEND=simulated)")
+    client = get_client(key)
+
+    CASSETTES.mkdir(exist_ok=True)
+    for path in paths:
+        source = path.read_text(encoding="utf-8")
+        for precheck in (True, False):
+            recorder = Recorder(client)
+            grade_source(source, model=model, client=recorder, use_cache=False, use_precheck=precheck)
+            if recorder.interactions:
+                break
+        cassette = {"file": path.name, "backend": LLM_BACKEND, "model": model,
+                    "precheck": precheck, "interactions": recorder.interactions}
+        (CASSETTES / f"{path.stem}.json").write_text(json.dumps(cassette, indent=2) + "\n",
+                                                     encoding="utf-8")
+        print(f"{path.name:<24} {len(recorder.interactions)} request(s) recorded", flush=True)
+
+
+def bench_file(path: Path, repeat: int) -> dict:
+    recording = json.loads((CASSETTES / f"{path.stem}.json").read_text(encoding="utf-8"))
+    cassette = Cassette(recording["interactions"])
+    source = path.read_text(encoding="utf-8")
+    model = recording["model"]
+    precheck = recording.get("precheck", True)
+
+    def end_to_end():
+        cassette.rewind()
+        result = grade_source(source, model=model, client=cassette, use_cache=False,
+                              use_precheck=precheck)
+        with contextlib.redirect_stdout(io.StringIO()):
+            format_full_output(result, path.name)
+        return result
+
+    result = end_to_end()  # warm up, and the result the micro-benchmarks reuse
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        end_to_end()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    end_to_end()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    verdicts = [r["content"] for r in recording["interactions"] if r["kind"] != "analysis"]
+    number = 200
+    parse = min(timeit.repeat(lambda: [parse_verdict(v) for v in verdicts],
+                              number=number, repeat=5)) / number
+    sink = io.StringIO()
+
+    def format_once():
+        sink.seek(0)
+        with contextlib.redirect_stdout(sink):
+            format_full_output(result, path.name)
+
+    fmt = min(timeit.repeat(format_once, number=number, repeat=5)) / number
+
+    return {
+        "end_to_end_ms": round(statistics.median(times) * 1000, 3),
+        "parse_us": round(parse * 1e6, 3),
+        "format_us": round(fmt * 1e6, 3),
+        "peak_kib": round(peak / 1024, 1),
+        "requests": len(recording["interactions"]),
+        "stale": cassette.stale,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Every metric that got worse than the baseline by more than threshold."""
+    pairs = [(f"{name}.{m}", m, results["files"][name].get(m), old.get(m))
+             for name, old in baseline.get("files", {}).items() if name in results["files"]
+             for m in METRICS]
+    pairs.append(("startup_ms", "startup_ms", results.get("startup_ms"), baseline.get("startup_ms")))
+
+    regressions = []
+    for label, metric, new, old in pairs:
+        if new is not None and old and new > old * (1 + threshold) and new - old > NOISE[metric]:
+            regressions.append(f"{label}: {old} -> {new} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded responses and benchmark INVSC.")
+    parser.add_argument("paths", nargs="*", default=[str(ROOT / "examples")])
+    parser.add_argument("--repeat", type=int, default=20, help="End-to-end runs per file")
+    parser.add_argument("--output", type=Path, default=None, help="Write the results as JSON")
+    parser.add_argument("--baseline", type=Path, default=None, help="Results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed slowdown over the baseline, as a fraction (default: 0.25)")
+    parser.add_argument("--record", action="store_true", help="Record new cassettes instead")
+    parser.add_argument("--model", default=OPENAI_MODEL, help="Model to record with")
+    parser.add_argument("--api-key", default=None)
+    args = parser.parse_args()
+
+    paths = collect_sources(args.paths)
+    if not paths:
+        sys.exit("replay: no .scala files found")
+
+    if args.record:
+        record(paths, args.model, args.api_key)
+        return
+
+    # Replayed requests cost nothing; pacing them would only measure the limiter
+    ratelimit.requests_bucket = ratelimit.TokenBucket(1e12)
+    ratelimit.tokens_bucket = ratelimit.TokenBucket(1e12)
+
+    results = {"python": sys.version.split()[0], "files": {}}
+    for path in paths:
+        if not (CASSETTES / f"{path.stem}.json").is_file():
+            print(f"{path.name:<24} no cassette, skipped", flush=True)
+            continue
+        r = results["files"][path.name] = bench_file(path, args.repeat)
+        print(f"{path.name:<24} end-to-end {r['end_to_end_ms']:>8.2f} ms  "
+              f"parse {r['parse_us']:>7.1f} us  format {r['format_us']:>7.1f} us  "
+              f"peak {r['peak_kib']:>8.1f} KiB"
+              + (f"  ({r['stale']} stale)" if r["stale"] else ""), flush=True)
+
+    startup = [first_output([sys.executable, "-m", "invsc", "--help"], dict(os.environ))
+               for _ in range(5)]
+    results["startup_ms"] = round(statistics.median(startup) * 1000, 1)
+    print(f"{'startup (--help)':<24} {results['startup_ms']:>8.1f} ms")
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text(encoding="utf-8")),
+                              args.threshold)
+        if regressions:
+            print()
+            print("Regressions over the baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions over {args.baseline} (threshold {args.threshold:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Measure how quickly invsc produces its first output on the paths that never
+touch the network: --help, --no-key, a verdict cache hit and a file whose
+grade the static pre-check already decides.
+
+Each mode is run as a fresh process, timed from spawn to the first byte on
+stdout or stderr, and checked for whether it imported openai at all. Times
+are reported both raw and as overhead over a bare `python -c "print()"`, and
+the script exits non-zero if any mode's median overhead exceeds the budget.
+
+Usage:
+    python benchmarks/startup.py [--repeat 10] [--budget-ms 50] [--output out.json]
+"""
+
+import argparse
+import json
+import os
+import selectors
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from invsc.cache import DiskCache  # noqa: E402
+from invsc.config import OPENAI_MODEL  # noqa: E402
+from invsc.gpt_client import verdict_cache_key  # noqa: E402
+from invsc.grader import precheck_notes  # noqa: E402
+from invsc.scanner import precheck  # noqa: E402
+
+
+ANNOTATED = """object Sum {
+  def sum(a: Array[Int]): Int = {
+    var s = 0; var i = 0
+    // Invariant: s = sum(a[0..i)) and 0 <= i <= a.length
+    // Variant: a.length - i
+    while (i < a.length) { s += a(i); i += 1 }
+    s
+  }
+}
+"""
+
+UNANNOTATED = """object Count {
+  def count(n: Int): Int = {
+    var i = 0
+    while (i < n) i += 1
+    i
+  }
+}
+"""
+
+
+def prepare(workdir: Path) -> dict[str, list[str]]:
+    """Write the sample files, seed a cached verdict and return each mode's arguments."""
+    annotated = workdir / "Sum.scala"
+    annotated.write_text(ANNOTATED, encoding="utf-8")
+    unannotated = workdir / "Count.scala"
+    unannotated.write_text(UNANNOTATED, encoding="utf-8")
+
+    # The same key grade_source looks up for this file
+    notes = precheck_notes(precheck(ANNOTATED)["loops"])
+    DiskCache("verdicts", directory=workdir / "cache").put(
+        verdict_cache_key(ANNOTATED, OPENAI_MODEL, notes),
+        {"grade": "beta", "summary": "cached", "warnings": [], "analysis": ""},
+    )
+
+    return {
+        "help": ["--help"],
+        "no-key": ["--no-key", "--no-action", str(unannotated)],
+        "cache-hit": ["--json", "--no-action", "--no-compile", str(annotated)],
+        "precheck": ["--json", "--no-action", "--no-compile", str(unannotated)],
+    }
+
+
+def first_output(cmd: list[str], env: dict) -> float:
+    """Seconds from spawning cmd to its first byte of output."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=env, cwd=ROOT,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    with selectors.DefaultSelector() as sel:
+        sel.register(proc.stdout, selectors.EVENT_READ)
+        sel.register(proc.stderr, selectors.EVENT_READ)
+        sel.select(timeout=30)
+    elapsed = time.perf_counter() - start
+    proc.kill()
+    proc.communicate()
+    return elapsed
+
+
+def imports_openai(args: list[str], env: dict) -> bool:
+    result = subprocess.run([sys.executable, "-X", "importtime", "-m", "invsc", *args],
+                            env=env, cwd=ROOT, capture_output=True, text=True, timeout=60)
+    return any(line.split("|")[-1].strip() == "openai" for line in result.stderr.splitlines())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure invsc's time to first output.")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per mode")
+    parser.add_argument("--budget-ms", type=float, default=50,
+                        help="Fail if any mode's median overhead over bare Python exceeds this")
+    parser.add_argument("--output", type=Path, default=None, help="Write the results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="invsc-startup-") as tmp:
+        workdir = Path(tmp)
+        modes = prepare(workdir)
+        env = {**os.environ, "INVSC_CACHE_DIR": str(workdir / "cache"), "OPENAI_API_KEY": ""}
+
+        # Python's own startup, for reference
+        baseline = statistics.median(
+            first_output([sys.executable, "-c", "print()"], env) for _ in range(args.repeat)
+        )
+        print(f"{'python':<10} median {baseline * 1000:>7.1f} ms", flush=True)
+
+        results = {}
+        for mode, mode_args in modes.items():
+            cmd = [sys.executable, "-m", "invsc", *mode_args]
+            times = [first_output(cmd, env) for _ in range(args.repeat)]
+            results[mode] = {
+                "median_ms": round(statistics.median(times) * 1000, 1),
+                "min_ms": round(min(times) * 1000, 1),
+                "overhead_ms": round((statistics.median(times) - baseline) * 1000, 1),
+                "imports_openai": imports_openai(mode_args, env),
+            }
+            r = results[mode]
+            print(f"{mode:<10} median {r['median_ms']:>7.1f} ms  min {r['min_ms']:>7.1f} ms  "
+                  f"overhead {r['overhead_ms']:>6.1f} ms  "
+                  f"openai {'imported' if r['imports_openai'] else 'not imported'}", flush=True)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    slow = [m for m, r in results.items() if r["overhead_ms"] > args.budget_ms]
+    if slow:
+        sys.exit(f"startup: over the {args.budget_ms:g} ms budget: {', '.join(slow)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+LLM backends for INVSC — what gpt_client sends its chat completions to.
+
+A backend is any object shaped like the OpenAI client as far as gpt_client
+uses it: backend.chat.completions.create(**kwargs) returning a completion (or,
+with stream=True, an iterable of chunks), and close(). Backends are looked up
+by name in a registry, so a new one only needs register_backend(); the one
+in use is chosen with INVSC_BACKEND (default "openai", see session.py).
+
+The "simulated" backend never touches the network. It answers every request
+with a canned analysis or verdict after a random delay, and fails a chosen
+fraction of requests with 5xx or 429 errors shaped like the OpenAI SDK's, so
+that concurrency, caching, rate limiting and retries can be load tested
+offline:
+
+    INVSC_BACKEND=simulated INVSC_SIM_LATENCY=lognormal:2:0.5 \\
+    INVSC_SIM_ERROR_RATE=0.02 INVSC_SIM_RATE_LIMIT_RATE=0.05 invsc batch submissions/
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from .config import (
+    SIM_LATENCY, SIM_ERROR_RATE, SIM_RATE_LIMIT_RATE, SIM_RETRY_AFTER, SIM_SEED,
+)
+
+
+_factories = {}
+
+
+def register_backend(name: str, factory):
+    """Make a backend available as INVSC_BACKEND=name. factory(api_key) builds it."""
+    _factories[name] = factory
+
+
+def create_backend(name: str, api_key: str):
+    try:
+        factory = _factories[name]
+    except KeyError:
+        raise ValueError(f"unknown backend '{name}' (known: {', '.join(sorted(_factories))})")
+    return factory(api_key)
+
+
+def parse_latency(spec: str):
+    """
+    Turn a latency spec into a function of a random.Random returning seconds:
+    fixed:S, uniform:LO:HI, exponential:MEAN or lognormal:MEDIAN:SIGMA.
+    """
+    kind, *params = spec.split(":")
+    try:
+        values = [float(p) for p in params]
+        if kind == "fixed":
+            (seconds,) = values
+            return lambda rng: seconds
+        if kind == "uniform":
+            lo, hi = values
+            return lambda rng: rng.uniform(lo, hi)
+        if kind == "exponential":
+            (mean,) = values
+            return lambda rng: rng.expovariate(1 / mean) if mean > 0 else 0.0
+        if kind == "lognormal":
+            median, sigma = values
+            return lambda rng: median * rng.lognormvariate(0, sigma)
+    except ValueError:
+        pass
+    raise ValueError(f"bad latency spec '{spec}'")
+
+
+class SimulatedAPIError(Exception):
+    """A failed request, with the status_code and response.headers the SDK's errors carry."""
+
+    def __init__(self, status_code: int, message: str, headers: dict | None = None):
+        super().__init__(f"Error code: {status_code} - {message}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+# (analysis, grade, summary, warning) — picked by a hash of the source, so a
+# given file always gets the same verdict
+CANNED = [
+    ("The invariant is established before the loop, maintained by every iteration "
+     "and, with the negated guard, implies the postcondition. The variant is a "
+     "non-negative integer that strictly decreases.",
+     "alpha", "Exemplary. The invariants are stated precisely and hold throughout.", None),
+    ("The invariant holds on entry and is preserved, but it is stated informally and "
+     "leaves the bounds on the index implicit.",
+     "alphabeta", "Sound reasoning, if a little loose in its statement of the bounds.",
+     "The invariant does not state the bounds on the loop index."),
+    ("The stated invariant is not preserved: after the update of the accumulator it no "
+     "longer describes the prefix that has been processed.",
+     "beta", "The invariant is asserted rather than maintained.",
+     "The invariant is not preserved by the loop body."),
+    ("The variant does not decrease on every iteration, so termination is not shown, "
+     "and the invariant is too weak to imply the postcondition.",
+     "gammabeta", "Neither termination nor correctness has been established.",
+     "The variant does not decrease on every iteration."),
+]
+
+LOOP_LINES_RE = re.compile(r"loops starting on lines ([\d, ]+)")
+SOURCE_RE = re.compile(r"```scala\n(.*?)```", re.DOTALL)
+
+
+class SimulatedBackend:
+    """An offline stand-in for the OpenAI client with canned answers and injected faults."""
+
+    def __init__(self, latency: str = SIM_LATENCY, error_rate: float = SIM_ERROR_RATE,
+                 rate_limit_rate: float = SIM_RATE_LIMIT_RATE,
+                 retry_after: float = SIM_RETRY_AFTER, seed: int | None = SIM_SEED):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def close(self):
+        pass
+
+    def create(self, **kwargs):
+        with self.lock:
+            delay = self.latency(self.rng)
+            roll = self.rng.random()
+        time.sleep(delay)
+
+        if roll < self.rate_limit_rate:
+            raise SimulatedAPIError(429, "Rate limit reached (simulated)",
+                                    {"retry-after": str(self.retry_after)})
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise SimulatedAPIError(500, "The server had an error (simulated)")
+
+        content = self._answer(kwargs["messages"], kwargs.get("response_format"))
+        prompt_chars = sum(len(m["content"]) for m in kwargs["messages"])
+        usage = SimpleNamespace(prompt_tokens=prompt_chars // 4,
+                                completion_tokens=max(1, len(content) // 4))
+
+        if not kwargs.get("stream"):
+            message = SimpleNamespace(content=content)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+        include_usage = (kwargs.get("stream_options") or {}).get("include_usage")
+        return self._stream(content, usage if include_usage else None)
+
+    def _stream(self, content: str, usage):
+        for i in range(0, len(content), 16):
+            delta = SimpleNamespace(content=content[i:i + 16])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+        if usage is not None:
+            yield SimpleNamespace(choices=[], usage=usage)
+
+    def _answer(self, messages: list[dict], response_format: dict | None) -> str:
+        prompt = messages[1]["content"]
+        source = SOURCE_RE.search(prompt)
+        digest = hashlib.sha256((source.group(1) if source else prompt).encode("utf-8")).digest()
+        analysis, grade, summary, warning = CANNED[digest[0] % len(CANNED)]
+
+        if response_format is None:
+            return analysis
+
+        verdict = {
+            "grade": grade,
+            "summary": summary,
+            "warnings": [{"line": None, "severity": "warning", "message": warning}] if warning else [],
+        }
+        if response_format.get("type") == "json_schema":
+            verdict = {"analysis": analysis, **verdict}
+        if '"loops": [' in messages[-1]["content"]:
+            lines = LOOP_LINES_RE.search(prompt)
+            verdict["loops"] = [
+                {"line": int(n), "grade": grade, "warnings": verdict["warnings"]}
+                for n in re.findall(r"\d+", lines.group(1) if lines else "")
+            ]
+        return json.dumps(verdict)
+
+
+register_backend("simulated", lambda api_key: SimulatedBackend())
@@ -0,0 +1,390 @@
+"""
+Batch mode for INVSC — grades a whole directory of submissions at once.
+
+Files are graded concurrently on a thread pool that shares the process-wide
+pooled OpenAI client, so wall-clock time scales with the concurrency limit
+rather than with the number of files. Results are reported as each file
+finishes.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .config import (
+    COLORS, PASSING_GRADES, BATCH_CONCURRENCY, OPENAI_API_KEY, COMPILE_JOBS, COMPILE_TIMEOUT,
+    DEDUP_THRESHOLD, VOTES, CASCADE_MODEL,
+)
+from .dedup import find_duplicates, adopt_verdict
+from .gpt_client import GPTError
+from .grader import grade_source
+from .incremental import grade_incremental, unsupported_options
+from .compiler import compile_all, compile_together, check_source
+from .session import get_client, needs_api_key
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+
+def parse_batch_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="invsc batch",
+        description="Grade many Scala submissions concurrently.",
+    )
+
+    parser.add_argument(
+        "sources",
+        type=str,
+        nargs="+",
+        help="Scala source files or directories containing .scala files",
+    )
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=BATCH_CONCURRENCY,
+        help=f"Number of files graded at once (default: {BATCH_CONCURRENCY}, or set INVSC_JOBS)",
+    )
+    parser.add_argument(
+        "--api-key",
+        type=str,
+        default=None,
+        help="OpenAI API key (or set OPENAI_API_KEY env var)",
+    )
+    parser.add_argument(
+        "--model",
+        type=str,
+        default=None,
+        help="OpenAI model to use (default: gpt-4o)",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="Output directory for approved files (default: parent directory of each source file)",
+    )
+    parser.add_argument(
+        "--compiler",
+        type=str,
+        default="fsc",
+        help="Scala Compiler to use for approved files (default: fsc)",
+    )
+    parser.add_argument(
+        "--no-compile",
+        action="store_true",
+        help="Only grade the files, skip compiling the approved ones",
+    )
+    parser.add_argument(
+        "--compile-jobs",
+        type=int,
+        default=COMPILE_JOBS,
+        help=f"Number of approved files compiled at once (default: {COMPILE_JOBS}, "
+             f"or set INVSC_COMPILE_JOBS)",
+    )
+    parser.add_argument(
+        "--compile-timeout",
+        type=float,
+        default=COMPILE_TIMEOUT,
+        help=f"Seconds each compiler run may take (default: {COMPILE_TIMEOUT:g}, "
+             f"or set INVSC_COMPILE_TIMEOUT)",
+    )
+    parser.add_argument(
+        "--compile-together",
+        action="store_true",
+        help="Compile all approved files with one compiler run per output directory "
+             "(fastest when the files don't define the same classes)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignore cached verdicts and always ask GPT again",
+    )
+    parser.add_argument(
+        "--no-precheck",
+        action="store_true",
+        help="Always ask GPT, even when the static loop scan already decides the grade",
+    )
+    parser.add_argument(
+        "--single-pass",
+        action="store_true",
+        help="Get the analysis and the verdict from one request (faster and cheaper, less careful)",
+    )
+    parser.add_argument(
+        "--cascade",
+        action="store_true",
+        help="Grade with a cheap model first and ask --model only for borderline or doubtful verdicts",
+    )
+    parser.add_argument(
+        "--cheap-model",
+        type=str,
+        default=None,
+        help=f"Model for the first tier of --cascade (default: {CASCADE_MODEL}, "
+             f"or set INVSC_CASCADE_MODEL)",
+    )
+    parser.add_argument(
+        "--votes",
+        type=int,
+        default=VOTES,
+        help=f"Draw this many verdicts per file concurrently and keep the majority "
+             f"(default: {VOTES}, or set INVSC_VOTES)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only regrade the loops that changed since this file's last verdict",
+    )
+    parser.add_argument(
+        "--check-first",
+        action="store_true",
+        help="Typecheck each file first and reject the ones that don't compile without calling GPT",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Grade one file per group of near-duplicate submissions with identical loops "
+             "and give the others its verdict",
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=DEDUP_THRESHOLD,
+        help=f"How similar (0-1) submissions must be to count as near-duplicates "
+             f"(default: {DEDUP_THRESHOLD:g}, or set INVSC_DEDUP_THRESHOLD)",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print one JSON result per line instead of formatted output (skips compilation)",
+    )
+
+    args = parser.parse_args(argv)
+    # Incremental grading has no single-pass, voting or cascade variant;
+    # refuse rather than quietly grade without them
+    unsupported = unsupported_options(args.single_pass, args.votes, args.cascade) if args.incremental else []
+    if unsupported:
+        parser.error("--incremental cannot be combined with "
+                     + ", ".join("--" + name.replace("_", "-") for name in unsupported))
+    return args
+
+
+def collect_sources(sources: list[str]) -> list[Path]:
+    """Expand the given files and directories into a sorted list of .scala files."""
+    found = []
+    for s in sources:
+        path = Path(s)
+        if path.is_dir():
+            found.extend(p for p in path.rglob("*.scala") if p.is_file())
+        elif path.is_file():
+            found.append(path)
+        else:
+            print(f"{COLORS['error']}invsc: error: no such file or directory: '{s}'{COLORS['reset']}",
+                  file=sys.stderr)
+    # Keep the order stable and drop duplicates
+    return sorted(set(found))
+
+
+def grade_file(source_path: Path, client: OpenAI | None, model: str | None = None,
+               use_cache: bool = True, use_precheck: bool = True,
+               incremental: bool = False, single_pass: bool = False,
+               check_compiler: str | None = None, check_first: bool = False,
+               votes: int = 1, cascade: bool = False, cheap_model: str | None = None) -> dict:
+    """Read and grade a single file. Raises GPTError on anything we can't grade."""
+    try:
+        source_code = source_path.read_text(encoding="utf-8")
+    except Exception as e:
+        raise GPTError(f"cannot read '{source_path}': {e}")
+
+    if not source_code.strip():
+        raise GPTError(f"'{source_path}' is empty")
+
+    if check_first:
+        check_exit, diagnostics = check_source(source_path, compiler=check_compiler)
+        if check_exit != 0:
+            raise GPTError(f"does not compile\n{diagnostics}".rstrip())
+
+    if incremental:
+        return grade_incremental(source_code, source_path, model=model, client=client,
+                                 use_cache=use_cache, use_precheck=use_precheck)
+    return grade_source(source_code, model=model, client=client, use_cache=use_cache,
+                        use_precheck=use_precheck, single_pass=single_pass, votes=votes,
+                        cascade=cascade, cheap_model=cheap_model)
+
+
+def print_file_result(source_path: Path, result: dict | None, error: str | None,
+                      elapsed: float, as_json: bool):
+    """Report the outcome for one file as soon as it is known."""
+    c = COLORS
+    if as_json:
+        record = {"file": str(source_path), "seconds": round(elapsed, 3)}
+        if error is not None:
+            record["error"] = error
+        else:
+            record.update(result)
+        print(json.dumps(record), flush=True)
+        return
+
+    if error is not None:
+        print(f"{c['bold']}{source_path}: {c['error']}error: {c['reset']}{error} "
+              f"{c['info']}({elapsed:.1f}s){c['reset']}", flush=True)
+        return
+
+    grade = result["grade"]
+    mark = "✓" if grade in PASSING_GRADES else "✗"
+    n_warnings = len(result.get("warnings", []))
+    origin = f", as {result['duplicate_of']}" if "duplicate_of" in result else ""
+    print(f"{c['bold']}{source_path}: {c.get(grade, c['reset'])}{mark} {grade}{c['reset']} "
+          f"— {n_warnings} warning(s) {c['info']}({elapsed:.1f}s{origin}){c['reset']}", flush=True)
+
+
+def print_compile_summary(builds: dict[Path, dict]):
+    """One line per compiled file: its status and how long its compiler ran."""
+    c = COLORS
+    width = max(len(str(p)) for p in builds)
+    print()
+    print(f"{'─' * 60}")
+    for path, build in sorted(builds.items()):
+        if build["exit_code"] == 0:
+            status = f"{c['alpha']}compiled{c['reset']}"
+        else:
+            status = f"{c['error']}failed ({build['exit_code']}){c['reset']}"
+        print(f"  {str(path):<{width}}  {build['seconds']:6.1f}s  {status}")
+    print(f"{'─' * 60}")
+
+
+def read_sources(sources: list[Path]) -> dict[Path, str]:
+    """The text of every source that can be read; the others are left to grade_file to report."""
+    texts = {}
+    for path in sources:
+        try:
+            texts[path] = path.read_text(encoding="utf-8")
+        except Exception:
+            pass
+    return texts
+
+
+def run_batch(sources: list[Path], client: OpenAI | None, jobs: int, model: str | None = None,
+              as_json: bool = False, use_cache: bool = True,
+              use_precheck: bool = True, incremental: bool = False,
+              single_pass: bool = False, check_first: bool = False,
+              compiler: str | None = None, dedup: bool = False,
+              dedup_threshold: float = DEDUP_THRESHOLD, votes: int = 1,
+              cascade: bool = False, cheap_model: str | None = None) -> dict[Path, dict]:
+    """
+    Grade all sources with at most `jobs` requests in flight.
+    Returns a mapping of path to result dict for every file that was graded.
+
+    With dedup, near-duplicate files with identical loops are grouped (see
+    dedup.py) and only the first of each group is graded; the others get its
+    verdict, marked with duplicate_of. If that file cannot be graded, the
+    others are graded on their own.
+    """
+    results = {}
+
+    def timed(path: Path):
+        start = time.perf_counter()
+        try:
+            result = grade_file(path, client, model=model, use_cache=use_cache,
+                                use_precheck=use_precheck, incremental=incremental,
+                                single_pass=single_pass, check_compiler=compiler,
+                                check_first=check_first, votes=votes,
+                                cascade=cascade, cheap_model=cheap_model)
+            return result, None, time.perf_counter() - start
+        except GPTError as e:
+            return None, str(e), time.perf_counter() - start
+        except Exception as e:
+            return None, f"internal error: {e}", time.perf_counter() - start
+
+    def adopted(path: Path, original: Path, result: dict):
+        start = time.perf_counter()
+        if check_first:
+            check_exit, diagnostics = check_source(path, compiler=compiler)
+            if check_exit != 0:
+                error = f"does not compile\n{diagnostics}".rstrip()
+                return None, error, time.perf_counter() - start
+        verdict = adopt_verdict(result, texts[path], texts[original])
+        return {**verdict, "duplicate_of": str(original)}, None, time.perf_counter() - start
+
+    copies = {}  # representative -> the files waiting for its verdict
+    if dedup:
+        texts = read_sources(sources)
+        for group in find_duplicates(texts, dedup_threshold):
+            copies[group[0]] = group[1:]
+        sources = [p for p in sources if p in copies or p not in texts]
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = {pool.submit(timed, path): path for path in sources}
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = futures.pop(future)
+                result, error, elapsed = future.result()
+                print_file_result(path, result, error, elapsed, as_json)
+                if result is not None:
+                    results[path] = result
+                for copy in copies.pop(path, []):
+                    if result is not None:
+                        futures[pool.submit(adopted, copy, path, result)] = copy
+                    else:
+                        futures[pool.submit(timed, copy)] = copy
+
+    return results
+
+
+def batch_main(argv: list[str]):
+    args = parse_batch_args(argv)
+    c = COLORS
+
+    sources = collect_sources(args.sources)
+    if not sources:
+        print(f"{c['error']}invsc: error: no .scala files to grade{c['reset']}", file=sys.stderr)
+        sys.exit(1)
+
+    if not args.json:
+        print(f"{c['info']}[INVSC] Grading {len(sources)} file(s), {args.jobs} at a time...{c['reset']}")
+
+    # Without a key only cached verdicts can be returned; other files report the missing key
+    key = args.api_key or OPENAI_API_KEY
+    client = get_client(key) if key or not needs_api_key() else None
+    start = time.perf_counter()
+    results = run_batch(sources, client, args.jobs, model=args.model, as_json=args.json,
+                        use_cache=not args.no_cache, use_precheck=not args.no_precheck,
+                        incremental=args.incremental, single_pass=args.single_pass,
+                        check_first=args.check_first, compiler=args.compiler,
+                        dedup=args.dedup, dedup_threshold=args.dedup_threshold,
+                        votes=args.votes, cascade=args.cascade, cheap_model=args.cheap_model)
+    elapsed = time.perf_counter() - start
+
+    passed = sorted(p for p, r in results.items() if r["grade"] in PASSING_GRADES)
+    failed = len(sources) - len(passed)
+
+    if not args.json:
+        print()
+        print(f"{'─' * 60}")
+        print(f"{c['bold']}  {len(passed)} passed, {failed} refused or errored, "
+              f"{len(sources)} total in {elapsed:.1f}s{c['reset']}")
+        print(f"{'─' * 60}")
+
+    exit_code = 0 if failed == 0 else 1
+
+    # Compile the approved files
+    if passed and not args.no_compile and not args.json and args.compile_together:
+        print()
+        for compile_exit in compile_together(passed, out_dir=args.output,
+                                             compiler=args.compiler).values():
+            if compile_exit != 0:
+                exit_code = compile_exit
+    elif passed and not args.no_compile and not args.json:
+        print()
+        builds = compile_all(passed, out_dir=args.output, compiler=args.compiler,
+                             jobs=args.compile_jobs, timeout=args.compile_timeout)
+        print_compile_summary(builds)
+        for build in builds.values():
+            if build["exit_code"] != 0:
+                exit_code = build["exit_code"]
+
+    sys.exit(exit_code)
@@ -0,0 +1,97 @@
+"""
+On-disk cache for INVSC — remembers verdicts so unchanged files aren't re-graded.
+
+Entries are JSON files named by a content hash. Every hit refreshes the file's
+mtime, so the oldest mtime is always the least recently used entry; eviction
+drops entries older than the age limit first, then the least recently used
+ones until the cache fits its entry and size limits.
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+from .config import CACHE_DIR, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_MAX_AGE
+
+
+def cache_key(*parts: str) -> str:
+    """Hash the given strings into a cache key. Parts are length-prefixed so they can't run together."""
+    h = hashlib.sha256()
+    for part in parts:
+        data = part.encode("utf-8")
+        h.update(f"{len(data)}:".encode("ascii"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class DiskCache:
+    """A directory of JSON entries with LRU, size and age based eviction."""
+
+    def __init__(self, name: str, directory: Path | None = None,
+                 max_entries: int = CACHE_MAX_ENTRIES,
+                 max_bytes: int = CACHE_MAX_BYTES,
+                 max_age: float = CACHE_MAX_AGE):
+        self.directory = (directory or CACHE_DIR) / name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> dict | None:
+        """Return the stored value for key, or None on a miss or an expired entry."""
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+        if time.time() - entry.get("created", 0) > self.max_age:
+            path.unlink(missing_ok=True)
+            return None
+
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return entry.get("value")
+
+    def put(self, key: str, value: dict):
+        """Store value under key. Failures to write are silently ignored."""
+        path = self._path(key)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps({"created": time.time(), "value": value}), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+            return
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until within the limits."""
+        now = time.time()
+        entries = []
+        try:
+            for path in self.directory.glob("*.json"):
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                if now - st.st_mtime > self.max_age:
+                    path.unlink(missing_ok=True)
+                else:
+                    entries.append((st.st_mtime, st.st_size, path))
+        except OSError:
+            return
+
+        entries.sort()  # oldest access first
+        total = sum(size for _, size, _ in entries)
+        while entries and (len(entries) > self.max_entries or total > self.max_bytes):
+            _, size, path = entries.pop(0)
+            path.unlink(missing_ok=True)
+            total -= size
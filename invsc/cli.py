@@ -6,12 +6,15 @@ import argparse
 import sys
 from pathlib import Path
 
-from .config import COLORS, PASSING_GRADES
-from .gpt_client import query_gpt, GPTError
-from .formatter import format_full_output, print_banner, print_phase
-from .compiler import real_compile
+from .config import COLORS, PASSING_GRADES, VOTES, CASCADE_MODEL
+from .gpt_client import GPTError
+from .grader import grade_source
+from .incremental import grade_incremental, unsupported_options
+from .formatter import format_full_output, print_banner, print_phase, print_profile
+from .compiler import real_compile, check_source, SpeculativeCompile
 from .compiler import real_run
 from .actions import run_grade_action
+from .metrics import Metrics, activate
 
 
 # let the user specify the compiler and the output dir
@@ -21,7 +24,9 @@ def parse_args() -> argparse.Namespace:
         prog="invsc",
         description="INVSC — Invariant Scala Compiler. "
                     "The Scala compiler that judges your code like an Oxford tutor.",
-        epilog="Your code is only as good as your invariants.",
+        epilog="Your code is only as good as your invariants. "
+               "Use 'invsc batch DIR' to grade a whole directory of submissions, "
+               "or 'invsc serve' to grade them over HTTP.",
     )
 
     parser.add_argument(
@@ -68,6 +73,45 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Skip grade actions (no sound, no drama)",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignore cached verdicts and always ask GPT again",
+    )
+    parser.add_argument(
+        "--no-precheck",
+        action="store_true",
+        help="Always ask GPT, even when the static loop scan already decides the grade",
+    )
+    parser.add_argument(
+        "--single-pass",
+        action="store_true",
+        help="Get the analysis and the verdict from one request (faster and cheaper, less careful)",
+    )
+    parser.add_argument(
+        "--cascade",
+        action="store_true",
+        help="Grade with a cheap model first and ask --model only for borderline or doubtful verdicts",
+    )
+    parser.add_argument(
+        "--cheap-model",
+        type=str,
+        default=None,
+        help=f"Model for the first tier of --cascade (default: {CASCADE_MODEL}, "
+             f"or set INVSC_CASCADE_MODEL)",
+    )
+    parser.add_argument(
+        "--votes",
+        type=int,
+        default=VOTES,
+        help=f"Draw this many verdicts concurrently and keep the majority "
+             f"(default: {VOTES}, or set INVSC_VOTES)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only regrade the loops that changed since this file's last verdict",
+    )
     parser.add_argument(
         "--json",
         action="store_true",
@@ -78,6 +122,21 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Force compilation even if grade is below alpha-beta (live dangerously)",
     )
+    parser.add_argument(
+        "--check-first",
+        action="store_true",
+        help="Typecheck before grading and reject code that doesn't compile without calling GPT",
+    )
+    parser.add_argument(
+        "--speculative",
+        action="store_true",
+        help="Compile in the background while GPT grades; keep the result only if the grade passes",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print how long each phase took and how many tokens each pass used",
+    )
     parser.add_argument(
         "--verbose",
         action="store_true",
@@ -89,13 +148,33 @@ def parse_args() -> argparse.Namespace:
         help="Arguments passed through"
     )
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    # Incremental grading has no single-pass, voting or cascade variant;
+    # refuse rather than quietly grade without them
+    unsupported = unsupported_options(args.single_pass, args.votes, args.cascade) if args.incremental else []
+    if unsupported:
+        parser.error("--incremental cannot be combined with "
+                     + ", ".join("--" + name.replace("_", "-") for name in unsupported))
+    return args
 
 
 def main():
+    # `invsc batch ...` grades many files at once
+    if sys.argv[1:2] == ["batch"]:
+        from .batch import batch_main
+        batch_main(sys.argv[2:])
+
+    # `invsc serve` grades submissions sent over HTTP
+    if sys.argv[1:2] == ["serve"]:
+        from .server import serve_main
+        serve_main(sys.argv[2:])
+
     args = parse_args()
     c = COLORS
 
+    metrics = Metrics()
+    activate(metrics)
+
     source_path = Path(args.source)
 
     # Check file exists
@@ -113,7 +192,8 @@ def main():
 
     # Read source code
     try:
-        source_code = source_path.read_text(encoding="utf-8")
+        with metrics.phase("read"):
+            source_code = source_path.read_text(encoding="utf-8")
     except Exception as e:
         print(f"{c['error']}invsc: error: cannot read '{args.source}': {e}{c['reset']}", file=sys.stderr)
         sys.exit(1)
@@ -140,60 +220,131 @@ def main():
         sys.exit(exit_code)
 
 
-    # Query GPT
-    try:
-        result = query_gpt(source_code, api_key=args.api_key, model=args.model)
-    except GPTError as e:
-        print(f"{c['error']}invsc: error: {e}{c['reset']}", file=sys.stderr)
-        sys.exit(1)
-    except Exception as e:
-        print(f"{c['error']}invsc: internal error: {e}{c['reset']}", file=sys.stderr)
-        sys.exit(1)
+    # Broken code is rejected on the compiler's word alone, before any tokens are spent
+    if args.check_first:
+        with metrics.phase("check"):
+            check_exit, diagnostics = check_source(
+                source_path, compiler=None if args.compiler == "scala" else args.compiler
+            )
+        if check_exit != 0:
+            if diagnostics:
+                print(diagnostics, file=sys.stderr)
+            print(f"{c['error']}invsc: error: '{args.source}' does not compile; "
+                  f"fix the errors above before it can be graded{c['reset']}", file=sys.stderr)
+            sys.exit(check_exit)
 
-    
+    # Compile alongside grading, into a staging directory that is only
+    # published if the grade allows it
+    speculative = None
+    if args.speculative and not args.no_compile and args.compiler != "scala":
+        speculative = SpeculativeCompile(source_path, out_dir=args.output, compiler=args.compiler)
 
-    # Output results
-    if args.json:
-        import json
-        print(json.dumps(result, indent=2))
-        exit_code = 0 if result["grade"] in PASSING_GRADES else 1
-    else:
-        # Show verbose analysis if requested
-        if args.verbose and "analysis" in result:
+    # With --verbose, pass 1 is printed as it streams in
+    streamed = False
+
+    def print_analysis_token(text: str):
+        nonlocal streamed
+        if not streamed:
+            streamed = True
             print(f"{c['info']}{'─' * 60}{c['reset']}")
             print(f"{c['bold']}GPT Analysis (chain-of-thought):{c['reset']}")
             print(f"{c['info']}{'─' * 60}{c['reset']}")
-            print(result["analysis"])
+        print(text, end="", flush=True)
+
+    stream_to = print_analysis_token if args.verbose and not args.json else None
+
+    # Start compiling as soon as pass 2 reveals a passing grade, also into
+    # staging: the final grade (or an error) may still refuse the submission
+    def start_early_compile(grade: str):
+        nonlocal speculative
+        if speculative is None and (grade in PASSING_GRADES or args.force) and not args.no_compile and args.compiler != "scala":
+            speculative = SpeculativeCompile(source_path, out_dir=args.output, compiler=args.compiler)
+
+    # However this ends (an error, Ctrl-C), nothing staged is left behind;
+    # after a commit or an earlier discard this is a no-op
+    try:
+        # Query GPT
+        try:
+            with metrics.phase("grade"):
+                if args.incremental:
+                    result = grade_incremental(source_code, source_path, api_key=args.api_key,
+                                               model=args.model, use_cache=not args.no_cache,
+                                               use_precheck=not args.no_precheck)
+                else:
+                    result = grade_source(source_code, api_key=args.api_key, model=args.model,
+                                          use_cache=not args.no_cache, use_precheck=not args.no_precheck,
+                                          single_pass=args.single_pass, votes=args.votes,
+                                          cascade=args.cascade, cheap_model=args.cheap_model,
+                                          on_analysis_token=stream_to, on_grade=start_early_compile)
+        except GPTError as e:
+            print(f"{c['error']}invsc: error: {e}{c['reset']}", file=sys.stderr)
+            sys.exit(1)
+        except Exception as e:
+            print(f"{c['error']}invsc: internal error: {e}{c['reset']}", file=sys.stderr)
+            sys.exit(1)
+
+        if streamed:
+            print()
             print(f"{c['info']}{'─' * 60}{c['reset']}")
             print()
 
-        exit_code = format_full_output(result, args.source)
+        # Output results (with --json, once the metrics are complete)
+        if args.json:
+            exit_code = 0 if result["grade"] in PASSING_GRADES else 1
+        else:
+            # Show verbose analysis if requested
+            if args.verbose and "analysis" in result and not streamed:
+                print(f"{c['info']}{'─' * 60}{c['reset']}")
+                print(f"{c['bold']}GPT Analysis (chain-of-thought):{c['reset']}")
+                print(f"{c['info']}{'─' * 60}{c['reset']}")
+                print(result["analysis"])
+                print(f"{c['info']}{'─' * 60}{c['reset']}")
+                print()
 
-    # Grade actions
-    if not args.no_action:
-        run_grade_action(
-            result["grade"],
-            filename=args.source,
-            summary=result.get("summary", ""),
-        )
+            exit_code = format_full_output(result, args.source)
 
-    # Actual Scala compilation
-    grade = result["grade"]
-    should_compile = grade in PASSING_GRADES or args.force
+        # Grade actions
+        if not args.no_action:
+            with metrics.phase("action"):
+                run_grade_action(
+                    result["grade"],
+                    filename=args.source,
+                    summary=result.get("summary", ""),
+                )
 
-    if args.force and grade not in PASSING_GRADES:
-        print(f"\n{c['warning']}invsc: warning: --force flag used. "
-              f"Compiling despite shameful grade. The compiler will remember this.{c['reset']}")
+        # Actual Scala compilation
+        grade = result["grade"]
+        should_compile = grade in PASSING_GRADES or args.force
 
-    if should_compile and not args.no_compile:
-        print()
-        if args.compiler == "scala":
-            compile_exit = real_run(source_path, extra_args = args.args)
-        else:
-            compile_exit = real_compile(source_path, out_dir = args.output, compiler = args.compiler)
-        if compile_exit != 0:
-            exit_code = compile_exit
-    
+        if args.force and grade not in PASSING_GRADES:
+            print(f"\n{c['warning']}invsc: warning: --force flag used. "
+                  f"Compiling despite shameful grade. The compiler will remember this.{c['reset']}")
+
+        if speculative is not None and not should_compile:
+            speculative.discard()
+
+        if should_compile and not args.no_compile:
+            print()
+            # With --speculative or an early start, this is only the wait that's left
+            with metrics.phase("run" if args.compiler == "scala" else "compile"):
+                if args.compiler == "scala":
+                    compile_exit = real_run(source_path, extra_args = args.args)
+                elif speculative is not None:
+                    compile_exit = speculative.commit()
+                else:
+                    compile_exit = real_compile(source_path, out_dir = args.output, compiler = args.compiler)
+            if compile_exit != 0:
+                exit_code = compile_exit
+    finally:
+        if speculative is not None:
+            speculative.discard()
+
+    if args.json:
+        import json
+        print(json.dumps({**result, "metrics": metrics.as_dict()}, indent=2))
+
+    if args.profile:
+        print_profile(metrics.as_dict())
 
     sys.exit(exit_code)
 
@@ -2,13 +2,32 @@
 Scala compilation step — calls scalac after INVSC approves the code.
 """
 
+import hashlib
+import json
+import re
 import subprocess
 import shutil
 import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import os
 
-from .config import COLORS
+from .cache import cache_key
+from .config import COLORS, CACHE_DIR, ARTIFACT_MAX_ENTRIES, COMPILE_JOBS, COMPILE_TIMEOUT
+from .daemon import ensure_fsc, fsc_flags
+from .scanner import find_main
+
+
+MANIFEST_NAME = ".invsc-manifest.json"
+OUTPUT_SUFFIXES = (".class", ".tasty")  # what scalac writes for each compiled class
+ANSI_RE = re.compile(r"\x1b\[[0-9;]*m")
+# What the JVM says when a class path can't start the program at all
+LAUNCH_FAILURE_RE = re.compile(r"Could not find or load main class|NoClassDefFoundError: scala/|[Nn]o main class")
+ARTIFACT_DIR = CACHE_DIR / "classes"
+_manifest_lock = threading.Lock()
 
 
 def real_compile(source_path: Path, out_dir:Path | None = None , compiler:str | None = None) -> int:
@@ -16,25 +35,194 @@ def real_compile(source_path: Path, out_dir:Path | None = None , compiler:str |
     Run the Scala compiler (fsc or scalac) on the source file.
     Returns the compiler's exit code.
     """
-    c = COLORS
-    ext = source_path.suffix.lower()
+    return _compile(source_path, out_dir, compiler, print)
 
-    if ext != ".scala":
-        print(f"{c['warning']}invsc: warning: '{source_path.name}' is not a .scala file. "
-              f"Invariant check passed but skipping compilation of {source_path.name}.{c['reset']}")
-        return 0
-    
+
+def compile_captured(source_path: Path, out_dir: Path | None = None,
+                     compiler: str | None = None) -> tuple[int, str]:
+    """real_compile, returning (exit code, everything it would have printed) instead."""
+    lines = []
+
+    def log(*args, file=sys.stdout, **kwargs):
+        lines.append(ANSI_RE.sub("", " ".join(str(a) for a in args)))
+
+    return _compile(source_path, out_dir, compiler, log), "\n".join(lines)
+
+
+class CompileJob:
+    """
+    A real_compile run started in the background, e.g. as soon as the grade is
+    known but before the rest of the verdict has arrived. Its output is held
+    back and printed by wait(), so it doesn't interleave with other output.
+    """
+
+    def __init__(self, source_path: Path, out_dir: Path | None = None, compiler: str | None = None):
+        self._messages = []
+        self._exit_code = 1
+        self._proc = None
+        self._cancelled = False
+        self._thread = threading.Thread(
+            target=self._run, args=(source_path, out_dir, compiler), daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, source_path: Path, out_dir: Path | None, compiler: str | None):
+        def log(*args, file=sys.stdout, **kwargs):
+            self._messages.append((args, file, kwargs))
+
+        def started(proc):
+            self._proc = proc
+            if self._cancelled:
+                proc.kill()
+
+        self._exit_code = _compile(source_path, out_dir, compiler, log, on_start=started)
+
+    def wait(self) -> int:
+        """Wait for the compiler, print its output and return its exit code."""
+        self._thread.join()
+        for args, file, kwargs in self._messages:
+            print(*args, file=file, **kwargs)
+        self._messages.clear()
+        return self._exit_code
+
+    def cancel(self):
+        """Stop the compiler if it is still running and drop its output."""
+        self._cancelled = True
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.kill()
+        self._thread.join()
+        self._messages.clear()
+
+
+class SpeculativeCompile(CompileJob):
+    """
+    Compiles into a private staging directory while the submission is still
+    being graded. commit() moves the class files into the real output
+    directory once the grade allows it; discard() throws them away, so a
+    refused submission never leaves class files behind.
+    """
+
+    def __init__(self, source_path: Path, out_dir: Path | None = None, compiler: str | None = None):
+        self.out_dir = out_dir or source_path.parent
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        # Inside the output directory, so that the final moves are atomic renames
+        self.staging = Path(tempfile.mkdtemp(prefix=".invsc-", dir=self.out_dir))
+        super().__init__(source_path, self.staging, compiler)
+
+    def commit(self) -> int:
+        """Wait for the compiler, then publish its output. Returns the exit code."""
+        exit_code = self.wait()
+        try:
+            if exit_code == 0:
+                built = _load_manifest(self.staging)
+                for path in sorted(self.staging.rglob("*")):
+                    if path.is_file() and path.name != MANIFEST_NAME:
+                        dest = self.out_dir / path.relative_to(self.staging)
+                        dest.parent.mkdir(parents=True, exist_ok=True)
+                        os.replace(path, dest)
+                if built:
+                    record_build(self.out_dir, built)
+        finally:
+            shutil.rmtree(self.staging, ignore_errors=True)
+        return exit_code
+
+    def discard(self):
+        """Stop the compiler and delete everything it produced."""
+        self.cancel()
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+
+def _load_manifest(out_dir: Path) -> dict:
+    try:
+        return json.loads((out_dir / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _build_inputs(source_path: Path, compiler: str, flags: list[str]) -> dict:
+    """What a build depends on: the source's content, the compiler and its flags."""
+    return {
+        "source_hash": hashlib.sha256(source_path.read_bytes()).hexdigest(),
+        "compiler": compiler,
+        "flags": flags,
+    }
+
+
+def is_up_to_date(source_path: Path, out_dir: Path, compiler: str, flags: list[str]) -> bool:
+    """True if out_dir already holds the class files for this exact source, compiler and flags."""
+    entry = _load_manifest(out_dir).get(str(source_path.resolve()))
+    if not entry:
+        return False
+    try:
+        inputs = _build_inputs(source_path, compiler, flags)
+    except OSError:
+        return False
+    if any(entry.get(k) != v for k, v in inputs.items()):
+        return False
+    # Each output must still be the file this build wrote: a class file
+    # rebuilt from another source, or edited by hand, has another size or mtime
+    outputs = entry.get("outputs")
+    if not isinstance(outputs, dict):
+        return False  # manifest from before outputs were fingerprinted
+    return all(_fingerprint(out_dir / name) == stamp for name, stamp in outputs.items())
+
+
+def _fingerprint(path: Path) -> list[int] | None:
+    """A file's [size, mtime_ns], or None if it is missing."""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _output_snapshot(out_dir: Path) -> dict[str, list[int]]:
+    """
+    Every class and TASTy file under out_dir with its fingerprint, keyed by
+    relative path. Hidden directories are skipped: no package lives there,
+    and that is where .invsc-* staging builds (and, when out_dir is a home
+    directory, most of its bulk) are.
+    """
+    snapshot = {}
+    for root, dirs, files in os.walk(out_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in files:
+            if name.endswith(OUTPUT_SUFFIXES):
+                path = Path(root, name)
+                stamp = _fingerprint(path)
+                if stamp is not None:
+                    snapshot[path.relative_to(out_dir).as_posix()] = stamp
+    return snapshot
+
+
+def record_build(out_dir: Path, entries: dict[str, dict]):
+    """Merge manifest entries (keyed by resolved source path) into out_dir's manifest."""
+    with _manifest_lock:
+        manifest = _load_manifest(out_dir)
+        manifest.update(entries)
+        path = out_dir / MANIFEST_NAME
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        try:
+            tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+
+
+def _resolve_compiler(compiler: str | None, log) -> str | None:
+    """Pick the compiler to use: the requested one if usable, else fsc, else scalac."""
+    c = COLORS
     if compiler is not None:
         # Check whether compiler is on path
         if shutil.which(compiler):
             # Check whether compiler is a valid Scala compiler
             if compiler in ["fsc", "scalac"]:
-                print(f"{c['info']}[INVSC] Using {compiler} for compilation.{c['reset']}")
+                log(f"{c['info']}[INVSC] Using {compiler} for compilation.{c['reset']}")
             else:
-                print(f"{c['warning']}invsc: note: {compiler} was not recognised as a valid Scala compiler. Falling back on default compilers.{c['reset']}")
+                log(f"{c['warning']}invsc: note: {compiler} was not recognised as a valid Scala compiler. Falling back on default compilers.{c['reset']}")
                 compiler = None
         else:
-            print(f"{c['warning']}invsc: note: {compiler} was not found in PATH. Falling back on default compilers.{c['reset']}")
+            log(f"{c['warning']}invsc: note: {compiler} was not found in PATH. Falling back on default compilers.{c['reset']}")
             compiler = None
 
     if compiler is None:
@@ -42,56 +230,373 @@ def real_compile(source_path: Path, out_dir:Path | None = None , compiler:str |
         for candidate in ["fsc", "scalac"]:
             if shutil.which(candidate):
                 compiler = candidate
-                print(f"{c['info']}[INVSC] Compiler not specified. Defaulting to {compiler} for compilation.{c['reset']}")
+                log(f"{c['info']}[INVSC] Compiler not specified. Defaulting to {compiler} for compilation.{c['reset']}")
                 break
 
+    return compiler
+
+
+def check_source(source_path: Path, compiler: str | None = None) -> tuple[int, str]:
+    """
+    Parse and typecheck the source without generating code (-Ystop-after:typer),
+    so broken submissions can be rejected before any API call is made.
+    Returns (exit code, compiler diagnostics). If no compiler is available, or
+    the file isn't Scala, the check is skipped and reports success.
+    """
+    if source_path.suffix.lower() != ".scala":
+        return 0, ""
+
+    compiler = _resolve_compiler(compiler, lambda *args, **kwargs: None)
     if compiler is None:
-        print(f"{c['warning']}invsc: note: none of 'fsc' or 'scalac' found in PATH. "
-              f"Invariant check passed but cannot compile {source_path.name}.{c['reset']}")
-        print(f"{c['info']}  hint: install Scala via https://www.scala-lang.org/download/{c['reset']}")
-        return 0
+        return 0, ""
+    # The same compile server as real compilations, started or revived if need be
+    daemon_flags = []
+    if compiler == "fsc":
+        if ensure_fsc():
+            daemon_flags = fsc_flags()
+        elif shutil.which("scalac"):
+            compiler = "scalac"
 
+    # Nothing is written after the typer, but the compiler still wants a -d
+    with tempfile.TemporaryDirectory(prefix="invsc-check-") as scratch:
+        cmd = [compiler, *daemon_flags, "-Ystop-after:typer", "-d", scratch, str(source_path)]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=COMPILE_TIMEOUT,
+                                    shell=os.name == "nt")
+        except subprocess.TimeoutExpired:
+            return 1, f"typecheck timed out ({COMPILE_TIMEOUT:g}s)"
+        except Exception as e:
+            return 1, f"typecheck failed: {e}"
+
+    return result.returncode, (result.stdout + result.stderr).strip()
+
+
+def _compile(source_path: Path, out_dir: Path | None, compiler: str | None, log,
+             on_start=None) -> int:
+    """
+    real_compile, with all output going through log (a print-like function).
+    on_start, if given, receives the compiler process once it has been started.
+    """
     if out_dir is None:
-        print(f"{c['info']}[INVSC] Output directory not specified. Defaulting to parent of source file.{c['reset']}")
+        c = COLORS
+        log(f"{c['info']}[INVSC] Output directory not specified. Defaulting to parent of source file.{c['reset']}")
         out_dir = source_path.parent
+    return _compile_many([source_path], out_dir, compiler, log, on_start)
+
+
+def _stream_output(proc: subprocess.Popen, log, timeout: float):
+    """
+    Pass the process's stdout and stderr to log line by line as they arrive,
+    and wait for it to exit. Kills it and raises TimeoutExpired after timeout.
+    """
+    def pump(pipe, file):
+        for line in pipe:
+            log(line.rstrip("\n"), file=file)
+        pipe.close()
+
+    pumps = [threading.Thread(target=pump, args=(proc.stdout, sys.stdout), daemon=True),
+             threading.Thread(target=pump, args=(proc.stderr, sys.stderr), daemon=True)]
+    for t in pumps:
+        t.start()
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+        raise
+    finally:
+        for t in pumps:
+            t.join()
+
+
+def compile_all(source_paths: list[Path], out_dir: Path | None = None,
+                compiler: str | None = None, jobs: int = COMPILE_JOBS,
+                timeout: float = COMPILE_TIMEOUT) -> dict[Path, dict]:
+    """
+    Compile each source separately on a pool of at most `jobs` compilers.
+    Every output line is printed as soon as it is produced, prefixed with the
+    file it belongs to. Returns each source's {"exit_code", "seconds"}.
+
+    The single fsc compile server works through one file at a time, so a pool
+    of fsc clients would only queue up on it. With jobs > 1 the pool therefore
+    runs scalac when the compiler was left to the default; if fsc was asked
+    for explicitly, or scalac is not installed, the files are compiled with
+    fsc one at a time.
+    """
+    if jobs > 1 and _resolve_compiler(compiler, lambda *args, **kwargs: None) == "fsc":
+        if compiler is None and shutil.which("scalac"):
+            compiler = "scalac"
+        else:
+            jobs = 1
+        print(f"{COLORS['info']}[INVSC] fsc compiles one file at a time; "
+              f"compiling with {compiler or 'fsc'}, {jobs} at a time.{COLORS['reset']}")
+
+    print_lock = threading.Lock()
+
+    def build(path: Path) -> dict:
+        def log(*args, file=sys.stdout, **kwargs):
+            with print_lock:
+                print(f"{COLORS['bold']}[{path.name}]{COLORS['reset']}", *args,
+                      file=file, flush=True, **kwargs)
+
+        start = time.perf_counter()
+        exit_code = _compile_many([path], out_dir or path.parent, compiler, log, timeout=timeout)
+        return {"exit_code": exit_code, "seconds": time.perf_counter() - start}
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = {path: pool.submit(build, path) for path in source_paths}
+        return {path: future.result() for path, future in futures.items()}
+
+
+def compile_together(source_paths: list[Path], out_dir: Path | None = None,
+                     compiler: str | None = None) -> dict[Path, int]:
+    """
+    Compile many sources with one compiler invocation per output directory,
+    so the JVM (or compile server round trip) is paid once rather than per
+    file. If a combined run fails, its sources are compiled one at a time so
+    that each error is reported against the right file.
+    Returns each source's exit code.
+    """
+    groups: dict[Path, list[Path]] = {}
+    for path in source_paths:
+        groups.setdefault(out_dir or path.parent, []).append(path)
+
+    exit_codes = {}
+    for group_dir, paths in groups.items():
+        if len(paths) > 1 and _compile_many(paths, group_dir, compiler, print) == 0:
+            exit_codes.update({path: 0 for path in paths})
+            continue
+        if len(paths) > 1:
+            print(f"{COLORS['warning']}invsc: note: compiling {len(paths)} files together failed; "
+                  f"compiling them one at a time.{COLORS['reset']}")
+        for path in paths:
+            print()
+            exit_codes[path] = _compile_many([path], group_dir, compiler, print)
+    return exit_codes
+
+
+def _compile_many(source_paths: list[Path], out_dir: Path, compiler: str | None, log,
+                  on_start=None, timeout: float = COMPILE_TIMEOUT) -> int:
+    """
+    Compile the sources into out_dir with a single compiler invocation.
+    The compiler's output is passed to log line by line as it is produced.
+    """
+    c = COLORS
+
+    sources = []
+    for source_path in source_paths:
+        if source_path.suffix.lower() != ".scala":
+            log(f"{c['warning']}invsc: warning: '{source_path.name}' is not a .scala file. "
+                f"Invariant check passed but skipping compilation of {source_path.name}.{c['reset']}")
+        else:
+            sources.append(source_path)
+    if not sources:
+        return 0
+
+    names = ", ".join(p.name for p in sources)
+    compiler = _resolve_compiler(compiler, log)
+    if compiler is None:
+        log(f"{c['warning']}invsc: note: none of 'fsc' or 'scalac' found in PATH. "
+            f"Invariant check passed but cannot compile {names}.{c['reset']}")
+        log(f"{c['info']}  hint: install Scala via https://www.scala-lang.org/download/{c['reset']}")
+        return 0
+
+    flags = []
+    stale = []
+    # fsc only hands the work to a scalac in a server, so a build from the
+    # scalac fallback below is just as good
+    accepted = [compiler, "scalac"] if compiler == "fsc" else [compiler]
+    for source_path in sources:
+        if any(is_up_to_date(source_path, out_dir, name, flags) for name in accepted):
+            log(f"{c['info']}[INVSC] {out_dir} is up to date for {source_path.name}; "
+                f"skipping compilation.{c['reset']}")
+        else:
+            stale.append(source_path)
+    if not stale:
+        return 0
+
+    # Only now that there is something to compile is the server worth starting
+    if compiler == "fsc" and not ensure_fsc() and shutil.which("scalac"):
+        log(f"{c['warning']}invsc: note: the fsc compile server is not responding. "
+            f"Falling back on scalac.{c['reset']}")
+        compiler = "scalac"
 
     # Build command
     if compiler == "fsc":
-        # Fast Scala Compiler: fsc [-d outdir] file.scala      
-        cmd = ["fsc", "-d", str(out_dir), str(source_path)]  
+        # Fast Scala Compiler: fsc [-d outdir] file.scala ...
+        cmd = ["fsc", *fsc_flags(), *flags, "-d", str(out_dir), *map(str, stale)]
     elif compiler == "scalac":
-        # Scala Compiler: scalac [-d outdir] file.scala
-        cmd = ["scalac", "-d", str(out_dir), str(source_path)]
+        # Scala Compiler: scalac [-d outdir] file.scala ...
+        cmd = ["scalac", *flags, "-d", str(out_dir), *map(str, stale)]
 
-
-    print(f"{c['info']}[INVSC] Compiling: {' '.join(cmd)}{c['reset']}")
+    log(f"{c['info']}[INVSC] Compiling: {' '.join(cmd)}{c['reset']}")
 
     try:
         # Create output directory if it doesn't exist
         out_dir.mkdir(parents=True, exist_ok=True)
+        before = _output_snapshot(out_dir)
 
         windows = os.name == "nt"
 
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120, shell=windows)
-        if result.stdout:
-            print(result.stdout)
-        if result.stderr:
-            print(result.stderr, file=sys.stderr)
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                text=True, shell=windows)
+        if on_start is not None:
+            on_start(proc)
+        _stream_output(proc, log, timeout)
 
-        if result.returncode == 0:
-            print(f"{c['alpha']}[INVSC] {compiler} finished successfully.{c['reset']}")
+        if proc.returncode == 0:
+            log(f"{c['alpha']}[INVSC] {compiler} finished successfully.{c['reset']}")
+            # One invocation can't say which class came from which source, so
+            # every source in it is recorded with all of the classes
+            after = _output_snapshot(out_dir)
+            outputs = {name: stamp for name, stamp in sorted(after.items())
+                       if before.get(name) != stamp}
+            record_build(out_dir, {
+                str(source_path.resolve()): {**_build_inputs(source_path, compiler, flags),
+                                             "outputs": outputs}
+                for source_path in stale
+            })
         else:
-            print(f"{c['error']}[INVSC] {compiler} exited with code {result.returncode}.{c['reset']}")
+            log(f"{c['error']}[INVSC] {compiler} exited with code {proc.returncode}.{c['reset']}")
 
-        return result.returncode
+        return proc.returncode
     except subprocess.TimeoutExpired:
-        print(f"{c['error']}invsc: error: compilation timed out (120s){c['reset']}")
+        log(f"{c['error']}invsc: error: compilation timed out ({timeout:g}s){c['reset']}")
         return 1
     except Exception as e:
-        print(f"{c['error']}invsc: error: compilation failed: {e}{c['reset']}")
+        log(f"{c['error']}invsc: error: compilation failed: {e}{c['reset']}")
         return 1
 
 
+def _tool_fingerprint(name: str) -> str:
+    """
+    Identify the installed version of a tool without starting a JVM: its
+    resolved path, size and modification time all change on an upgrade.
+    """
+    path = shutil.which(name)
+    if path is None:
+        return ""
+    real = os.path.realpath(path)
+    st = os.stat(real)
+    return f"{real}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def _prune_artifacts():
+    """Keep only the ARTIFACT_MAX_ENTRIES most recently used compiled programs."""
+    try:
+        entries = sorted((p.stat().st_mtime, p) for p in ARTIFACT_DIR.iterdir()
+                         if p.is_dir() and not p.name.startswith("."))
+    except OSError:
+        return
+    for _, path in entries[:max(0, len(entries) - ARTIFACT_MAX_ENTRIES)]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def cached_classes(source_path: Path) -> tuple[Path | None, int]:
+    """
+    Compile the source with scalac into the artifact cache, unless a build of
+    the same source by the same scalac and scala is already there.
+    Returns (class directory, 0), or (None, exit code) if compilation failed.
+    """
+    c = COLORS
+    key = cache_key(source_path.read_text(encoding="utf-8"),
+                    _tool_fingerprint("scalac"), _tool_fingerprint("scala"))
+    classes = ARTIFACT_DIR / key
+    if classes.is_dir():
+        os.utime(classes)  # mark as recently used
+        print(f"{c['info']}[INVSC] Using cached build of {source_path.name}.{c['reset']}")
+        return classes, 0
+
+    ARTIFACT_DIR.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=".build-", dir=ARTIFACT_DIR))
+    try:
+        cmd = ["scalac", "-d", str(staging), str(source_path)]
+        print(f"{c['info']}[INVSC] Compiling: {' '.join(cmd)}{c['reset']}")
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=COMPILE_TIMEOUT,
+                                shell=os.name == "nt")
+        if result.stdout:
+            print(result.stdout)
+        if result.stderr:
+            print(result.stderr, file=sys.stderr)
+        if result.returncode != 0:
+            print(f"{c['error']}[INVSC] scalac exited with code {result.returncode}.{c['reset']}")
+            return None, result.returncode
+        try:
+            # Publish the finished build in one rename; a concurrent run may have won
+            os.rename(staging, classes)
+        except OSError:
+            pass
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    _prune_artifacts()
+    return classes, 0
+
+
+def _scala_library() -> list[str]:
+    """
+    The Scala library jars of the installation scalac belongs to: lib/ next
+    to its bin/ in both Scala 2 and Scala 3 distributions. Empty if scalac is
+    a launcher without one (e.g. installed by coursier).
+    """
+    scalac = shutil.which("scalac")
+    if scalac is None:
+        return []
+    lib = Path(os.path.realpath(scalac)).parent.parent / "lib"
+    return sorted(str(jar) for pattern in ("scala-library*.jar", "scala3-library*.jar")
+                  for jar in lib.glob(pattern))
+
+
+def _scala_cli_runner() -> bool:
+    """
+    True if `scala` is the Scala CLI runner of Scala 3.5 and later, which
+    takes --main-class, rather than the classic runner of Scala 2 and
+    earlier Scala 3, which takes the main class as its first argument.
+    """
+    try:
+        result = subprocess.run(["scala", "-version"], capture_output=True, text=True,
+                                timeout=COMPILE_TIMEOUT, shell=os.name == "nt")
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    output = result.stdout + result.stderr
+    return "Scala version (default)" in output or re.search(r"runner version:?\s*1\.", output) is not None
+
+
+def _launch_cached(classes: Path, main_class: str, extra_args: list[str]) -> list[str]:
+    """The command that runs main_class from a cached class directory."""
+    jars = _scala_library()
+    if jars and shutil.which("java"):
+        # Straight on the JVM: no runner start-up, and no runner flavour to guess
+        return ["java", "-cp", os.pathsep.join([*jars, str(classes)]), main_class, *extra_args]
+    if _scala_cli_runner():
+        return ["scala", "run", "--classpath", str(classes), "--main-class", main_class,
+                *(["--", *extra_args] if extra_args else [])]
+    return ["scala", "-cp", str(classes), main_class, *extra_args]
+
+
+def _run_program(cmd: list[str], fallback: bool = False) -> subprocess.CompletedProcess | None:
+    """
+    Run cmd and print its output. With fallback, return None instead, printing
+    nothing, if it could not start the program (missing launcher or main class).
+    """
+    c = COLORS
+    print(f"{c['info']}[INVSC] Running: {' '.join(cmd)}{c['reset']}")
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=COMPILE_TIMEOUT,
+                                shell=os.name == "nt")
+    except FileNotFoundError:
+        if fallback:
+            return None
+        raise
+    if fallback and result.returncode != 0 and LAUNCH_FAILURE_RE.search(result.stderr):
+        return None
+    if result.stdout:
+        print(result.stdout)
+    if result.stderr:
+        print(result.stderr, file=sys.stderr)
+    return result
+
+
 def real_run(source_path: Path, extra_args: list[str] | None = None) -> int:
     """
     Run the Scala command on the source file.
@@ -107,28 +612,41 @@ def real_run(source_path: Path, extra_args: list[str] | None = None) -> int:
     
 
     # Check if scala is on path
-    if shutil.which("scala"):
-        # Scala 3 CLI: scala compile file.scala
-        cmd = ["scala", str(source_path)]
-    else:
+    if not shutil.which("scala"):
         print(f"{c['warning']}invsc: note: 'scala' was not found in PATH. "
               f"Invariant check passed but cannot compile {source_path.name}.{c['reset']}")
         print(f"{c['info']}  hint: install Scala via https://www.scala-lang.org/download/{c['reset']}")        
         return 0
 
-    if extra_args:
-        cmd.extend(extra_args)
-
-    print(f"{c['info']}[INVSC] Compiling: {' '.join(cmd)}{c['reset']}")
+    # Compile once with scalac and run the cached classes from then on;
+    # without scalac or a recognisable main object, or if the cached classes
+    # can't be launched, let scala compile the script
+    extra_args = extra_args or []
+    script_cmd = ["scala", str(source_path), *extra_args]
+    cached_cmd = None
+    main_class = find_main(source_path.read_text(encoding="utf-8"))
+    if main_class is not None and shutil.which("scalac"):
+        try:
+            classes, compile_exit = cached_classes(source_path)
+        except subprocess.TimeoutExpired:
+            print(f"{c['error']}invsc: error: compilation timed out ({COMPILE_TIMEOUT:g}s){c['reset']}")
+            return 1
+        except Exception as e:
+            print(f"{c['error']}invsc: error: compilation failed: {e}{c['reset']}")
+            return 1
+        if classes is None:
+            return compile_exit
+        cached_cmd = _launch_cached(classes, main_class, extra_args)
 
     try:
-        windows = os.name == "nt"
-
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120, shell = windows)
-        if result.stdout:
-            print(result.stdout)
-        if result.stderr:
-            print(result.stderr, file=sys.stderr)
+        result = None
+        if cached_cmd is not None:
+            result = _run_program(cached_cmd, fallback=True)
+            if result is None:
+                print(f"{c['warning']}invsc: note: the cached build could not be started; "
+                      f"running {source_path.name} with scala instead.{c['reset']}")
+        if result is None:
+            result = _run_program(script_cmd)
 
         if result.returncode == 0:
             print(f"{c['alpha']}[INVSC] scala finished successfully.{c['reset']}")
@@ -137,7 +655,7 @@ def real_run(source_path: Path, extra_args: list[str] | None = None) -> int:
 
         return result.returncode
     except subprocess.TimeoutExpired:
-        print(f"{c['error']}invsc: error: compilation timed out (120s){c['reset']}")
+        print(f"{c['error']}invsc: error: compilation timed out ({COMPILE_TIMEOUT:g}s){c['reset']}")
         return 1
     except Exception as e:
         print(f"{c['error']}invsc: error: compilation failed: {e}{c['reset']}")
@@ -8,6 +8,98 @@ from pathlib import Path
 # OpenAI API config
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
 OPENAI_MODEL = os.environ.get("INVSC_MODEL", "gpt-4o")
+# With --cascade, files are graded by this cheaper model first and only
+# escalated to the main model when its verdict can't be trusted (see grader.py)
+CASCADE_MODEL = os.environ.get("INVSC_CASCADE_MODEL", "gpt-4o-mini")
+
+# Where chat completions go: "openai", or "simulated" for an offline backend
+# with canned answers (see backends.py). The simulated backend's latency is
+# fixed:S, uniform:LO:HI, exponential:MEAN or lognormal:MEDIAN:SIGMA seconds,
+# and the given fractions of its requests fail with a 5xx or a 429.
+LLM_BACKEND = os.environ.get("INVSC_BACKEND", "openai")
+SIM_LATENCY = os.environ.get("INVSC_SIM_LATENCY", "lognormal:1:0.5")
+SIM_ERROR_RATE = float(os.environ.get("INVSC_SIM_ERROR_RATE", "0"))
+SIM_RATE_LIMIT_RATE = float(os.environ.get("INVSC_SIM_RATE_LIMIT_RATE", "0"))
+SIM_RETRY_AFTER = float(os.environ.get("INVSC_SIM_RETRY_AFTER", "1"))
+SIM_SEED = int(os.environ["INVSC_SIM_SEED"]) if os.environ.get("INVSC_SIM_SEED") else None
+
+# INVSC_BACKEND=router spreads requests over several OpenAI-compatible
+# endpoints (see router.py), listed in INVSC_ENDPOINTS as JSON or in a JSON
+# file. Each endpoint's latency and error rate are tracked as moving
+# averages with this smoothing factor; after this many failures in a row it
+# is taken out of rotation for the cooldown, doubled on every further trip.
+ENDPOINTS = os.environ.get("INVSC_ENDPOINTS", "")
+ROUTER_SMOOTHING = float(os.environ.get("INVSC_ROUTER_SMOOTHING", "0.2"))
+ROUTER_TRIP_FAILURES = int(os.environ.get("INVSC_ROUTER_TRIP_FAILURES", "3"))
+ROUTER_COOLDOWN = float(os.environ.get("INVSC_ROUTER_COOLDOWN", "30"))
+
+# HTTP connection pool shared by every request in the process (see session.py)
+HTTP_MAX_CONNECTIONS = int(os.environ.get("INVSC_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.environ.get("INVSC_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("INVSC_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("INVSC_CONNECT_TIMEOUT", "10"))
+HTTP_TIMEOUT = float(os.environ.get("INVSC_TIMEOUT", "300"))
+
+# Rate limits and retries shared by every request in the process (see ratelimit.py).
+# Set these to your account's limits; they are corrected from response headers.
+RATE_LIMIT_RPM = float(os.environ.get("INVSC_RPM", "500"))
+RATE_LIMIT_TPM = float(os.environ.get("INVSC_TPM", "30000"))
+MAX_RETRIES = int(os.environ.get("INVSC_MAX_RETRIES", "6"))
+RETRY_BUDGET = float(os.environ.get("INVSC_RETRY_BUDGET", "30"))
+BACKOFF_BASE = float(os.environ.get("INVSC_BACKOFF_BASE", "1"))
+BACKOFF_MAX = float(os.environ.get("INVSC_BACKOFF_MAX", "60"))
+# Rough completion size used when estimating a request's token cost
+COMPLETION_TOKENS_ESTIMATE = int(os.environ.get("INVSC_COMPLETION_TOKENS", "1500"))
+
+# Self-consistency voting (--votes): how many verdicts are drawn per file
+# (1 turns it off) and the temperature each sample is drawn at, high
+# enough that the samples actually differ
+VOTES = int(os.environ.get("INVSC_VOTES", "1"))
+VOTE_TEMPERATURE = float(os.environ.get("INVSC_VOTE_TEMPERATURE", "0.7"))
+
+# Batch mode: how many files are graded at once
+BATCH_CONCURRENCY = int(os.environ.get("INVSC_JOBS", "8"))
+
+# Batch mode with --dedup (see dedup.py): how similar two submissions must
+# be (estimated Jaccard similarity of their normalised token shingles, 0-1)
+# before their loops are compared to decide whether they can share a verdict
+DEDUP_THRESHOLD = float(os.environ.get("INVSC_DEDUP_THRESHOLD", "0.8"))
+
+# `invsc serve` (see server.py): where it listens and how many submissions
+# may wait for a free grading slot before new ones are turned away
+SERVE_HOST = os.environ.get("INVSC_HOST", "127.0.0.1")
+SERVE_PORT = int(os.environ.get("INVSC_PORT", "8765"))
+SERVE_QUEUE = int(os.environ.get("INVSC_QUEUE", "64"))
+# Requests may only name files (and output directories) under this directory;
+# without it, `invsc serve` grades sent source only
+SERVE_ROOT = os.environ.get("INVSC_SERVE_ROOT", "")
+
+# Verdict cache (see cache.py)
+CACHE_DIR = Path(
+    os.environ.get("INVSC_CACHE_DIR")
+    or Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "invsc"
+)
+CACHE_MAX_ENTRIES = int(os.environ.get("INVSC_CACHE_MAX_ENTRIES", "5000"))
+CACHE_MAX_BYTES = int(os.environ.get("INVSC_CACHE_MAX_MB", "200")) * 1024 * 1024
+CACHE_MAX_AGE = float(os.environ.get("INVSC_CACHE_MAX_DAYS", "30")) * 24 * 3600
+# Compiled programs kept for --compiler scala (see compiler.real_run)
+ARTIFACT_MAX_ENTRIES = int(os.environ.get("INVSC_ARTIFACT_MAX_ENTRIES", "50"))
+
+# Files longer than this many lines are graded in shards split at method
+# boundaries (see shard.py). 0 disables sharding.
+SHARD_LINES = int(os.environ.get("INVSC_SHARD_LINES", "100"))
+
+# Compilation: how many compilers run at once in multi-file runs, and how
+# long a single compiler run may take
+COMPILE_JOBS = int(os.environ.get("INVSC_COMPILE_JOBS") or os.cpu_count() or 1)
+COMPILE_TIMEOUT = float(os.environ.get("INVSC_COMPILE_TIMEOUT", "120"))
+
+# fsc compile server (see daemon.py): minutes of idleness before it shuts
+# itself down (0 never), how long to wait for it to answer, and whether to
+# shut it down as soon as invsc exits
+FSC_MAX_IDLE = int(os.environ.get("INVSC_FSC_MAX_IDLE", "30"))
+FSC_START_TIMEOUT = float(os.environ.get("INVSC_FSC_START_TIMEOUT", "60"))
+FSC_SHUTDOWN_AT_EXIT = os.environ.get("INVSC_FSC_SHUTDOWN", "") not in ("", "0")
 
 # Path to the prompt template
 PROMPT_FILE = Path(__file__).parent / "prompt.txt"
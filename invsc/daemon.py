@@ -0,0 +1,67 @@
+"""
+Compile server for INVSC — keeps fsc's daemon warm and healthy.
+
+fsc hands every compilation to a long-lived compile server, but the first
+compilation after the server has gone away pays for a cold JVM start. The
+first fsc compile in a process starts the server (or finds the one already
+running) and checks that it answers; every later compile reuses it. The
+server is started with -max-idle, so it stays warm between invsc runs and
+shuts itself down once it has been unused for a while. Set
+INVSC_FSC_SHUTDOWN=1 to shut it down as soon as invsc exits instead.
+"""
+
+import atexit
+import os
+import shutil
+import subprocess
+import threading
+
+from .config import FSC_MAX_IDLE, FSC_START_TIMEOUT, FSC_SHUTDOWN_AT_EXIT
+
+
+_lock = threading.Lock()
+_healthy: bool | None = None  # None until the first check
+
+
+def fsc_flags() -> list[str]:
+    """Flags for every fsc call, so whichever call starts the server configures it."""
+    return ["-max-idle", str(FSC_MAX_IDLE)]
+
+
+def _fsc(*args: str) -> bool:
+    try:
+        result = subprocess.run(["fsc", *args], capture_output=True, text=True,
+                                timeout=FSC_START_TIMEOUT, shell=os.name == "nt")
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return result.returncode == 0
+
+
+def ensure_fsc() -> bool:
+    """
+    Make sure the compile server is up and answering, starting it if needed.
+    Returns False if fsc can't be used, so the caller can fall back on scalac.
+    Only the first call in a process does any work.
+    """
+    global _healthy
+    with _lock:
+        if _healthy is None:
+            if shutil.which("fsc") is None:
+                _healthy = False
+            else:
+                # A call with no source files still has to reach the server
+                # (starting it if there is none) and only succeeds once it
+                # answers, but unlike -reset it leaves the server's caches warm
+                _healthy = _fsc(*fsc_flags())
+                if not _healthy:
+                    # A wedged server: shut it down and start again from scratch
+                    _fsc("-shutdown")
+                    _healthy = _fsc(*fsc_flags())
+        return _healthy
+
+
+@atexit.register
+def shutdown_fsc():
+    """Shut down the compile server if INVSC_FSC_SHUTDOWN asks for it."""
+    if FSC_SHUTDOWN_AT_EXIT and _healthy:
+        _fsc("-shutdown")
@@ -0,0 +1,167 @@
+"""
+Near-duplicate detection for INVSC — one verdict for many copies of the same submission.
+
+In a class cohort many submissions are the lecture example with cosmetic
+edits: different layout, comments or variable names. The verdict cache keys
+on the exact text, so it misses all of them. Here every source is reduced to
+a token stream with comments and string contents dropped and identifiers
+renamed in order of first appearance, cut into overlapping shingles and
+summarised by a MinHash signature. Locality-sensitive hashing over bands of
+the signature finds candidate pairs without comparing every file with every
+other, and pairs whose estimated similarity reaches DEDUP_THRESHOLD are
+clustered.
+
+Similar text is not enough to share a grade: within each cluster, files are
+further split by their loops, compared as code plus annotations in the same
+renamed form. Only files whose loops match exactly share a verdict; the rest
+are graded on their own.
+"""
+
+import hashlib
+import random
+import re
+
+from .config import DEDUP_THRESHOLD
+from .scanner import lex, find_loops
+
+
+TOKEN_RE = re.compile(r"[A-Za-z_]\w*|\d+(?:\.\d+)?|\S")
+WORD_RE = re.compile(r"[A-Za-z_]\w*")
+
+SCALA_KEYWORDS = {
+    "abstract", "case", "catch", "class", "def", "do", "else", "extends", "false",
+    "final", "finally", "for", "forSome", "if", "implicit", "import", "lazy", "match",
+    "new", "null", "object", "override", "package", "private", "protected", "return",
+    "sealed", "super", "this", "throw", "trait", "try", "true", "type", "val", "var",
+    "while", "with", "yield", "then", "given", "using", "enum", "export",
+    # Names of the library that mean the same in every submission
+    "Int", "Long", "Double", "Boolean", "String", "Char", "Unit", "Array", "List",
+    "Map", "Set", "Seq", "Option", "Some", "None", "println", "print", "length",
+    "size", "require", "assert", "main", "args", "App", "math",
+}
+
+# Shingle length in tokens, MinHash signature length and LSH band count
+# (bands * rows = PERMUTATIONS). With 16 bands of 4 rows a pair at 0.8
+# similarity becomes a candidate with probability > 0.999.
+SHINGLE = 5
+PERMUTATIONS = 64
+BANDS = 16
+
+# Each "permutation" of the 64-bit shingle hashes is an XOR with a fixed
+# random mask: cheap enough to evaluate in C through map(), and close enough
+# to independent for clustering
+_rng = random.Random(0x1575C)
+_MASKS = [_rng.getrandbits(64) for _ in range(PERMUTATIONS)]
+
+
+def normalise(mask: str) -> tuple[list[str], dict[str, str]]:
+    """
+    The code tokens of a source (as masked by scanner.lex) with identifiers
+    renamed in order of first appearance, and the renaming itself.
+    """
+    names = {}
+    tokens = []
+    for tok in TOKEN_RE.findall(mask):
+        if WORD_RE.fullmatch(tok) and tok not in SCALA_KEYWORDS:
+            tok = names.setdefault(tok, f"v{len(names)}")
+        tokens.append(tok)
+    return tokens, names
+
+
+def shingles(tokens: list[str]) -> set[str]:
+    if len(tokens) <= SHINGLE:
+        return {" ".join(tokens)}
+    return {" ".join(tokens[i:i + SHINGLE]) for i in range(len(tokens) - SHINGLE + 1)}
+
+
+def minhash(items: set[str]) -> tuple[int, ...]:
+    """A MinHash signature of PERMUTATIONS values for a set of strings."""
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+              for s in items]
+    return tuple(min(map(mask.__xor__, hashes)) for mask in _MASKS)
+
+
+def similarity(sig_a: tuple[int, ...], sig_b: tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(a == b for a, b in zip(sig_a, sig_b)) / len(sig_a)
+
+
+def loop_signature(mask: str, loops: list[dict], names: dict[str, str]) -> tuple:
+    """
+    The loops of a source as (code, annotations) in renamed form. Two files
+    with equal loop signatures have the same loops with the same annotations,
+    up to layout and a consistent renaming of variables.
+    """
+    def rename(text: str) -> str:
+        return " ".join(names.get(t, t) for t in TOKEN_RE.findall(text))
+
+    return tuple(
+        (rename(mask[lp["start"]:lp["end"]]), rename(" ".join(lp["annotations"])))
+        for lp in loops
+    )
+
+
+def find_duplicates(sources: dict, threshold: float = DEDUP_THRESHOLD) -> list[list]:
+    """
+    Group sources ({key: source text}) into sets that can share one verdict.
+
+    Returns a list of groups, each a list of keys in the order given; the
+    first key of a group is its representative. Every key is in exactly one
+    group, most of them alone.
+    """
+    keys = list(sources)
+    signatures, loops = {}, {}
+    for key in keys:
+        mask, _ = lex(sources[key])
+        tokens, names = normalise(mask)
+        signatures[key] = minhash(shingles(tokens))
+        loops[key] = loop_signature(mask, find_loops(sources[key]), names)
+
+    # Union-find over the pairs that land in the same bucket of some band
+    # and are similar enough. Within a bucket, each file is only compared
+    # with the first file of every cluster seen there so far.
+    parent = {key: key for key in keys}
+
+    def root(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    rows = PERMUTATIONS // BANDS
+    for band in range(BANDS):
+        buckets = {}
+        for key in keys:
+            buckets.setdefault(signatures[key][band * rows:(band + 1) * rows], []).append(key)
+        for bucket in buckets.values():
+            heads = []
+            for key in bucket:
+                for head in heads:
+                    if root(head) == root(key):
+                        break
+                    if similarity(signatures[head], signatures[key]) >= threshold:
+                        parent[root(key)] = root(head)
+                        break
+                else:
+                    heads.append(key)
+
+    # Within each cluster, only files with identical loops share a verdict
+    groups = {}
+    for key in keys:
+        groups.setdefault((root(key), loops[key]), []).append(key)
+    return list(groups.values())
+
+
+def adopt_verdict(result: dict, source: str, original: str) -> dict:
+    """
+    A copy of the verdict graded for `original`, fitted to `source`, whose
+    loops are the same: warnings on a loop move with it to the copy's lines,
+    warnings outside any loop lose their line number.
+    """
+    moved = {}
+    for old, new in zip(find_loops(original), find_loops(source)):
+        for line in range(old["line"], old["end_line"] + 1):
+            moved[line] = min(new["end_line"], new["line"] + (line - old["line"]))
+
+    warnings = [{**w, "line": moved.get(w.get("line"))} for w in result.get("warnings", [])]
+    return {**result, "warnings": warnings}
@@ -94,6 +94,17 @@ def print_summary(summary: str):
         print(f"{c['bold']}Compiler's remarks:{c['reset']} {summary}")
 
 
+def print_votes(votes: dict):
+    """Print how far the sampled verdicts agreed on the grade."""
+    c = COLORS
+    shares = ", ".join(f"{g} ×{n}" for g, n in sorted(votes.get("grades", {}).items(),
+                                                       key=lambda item: -item[1]))
+    print()
+    print(f"{c['bold']}Examiners' agreement:{c['reset']} {votes['agreement']:.0%} "
+          f"of {votes['samples']} verdict(s) (of {votes['requested']} requested)"
+          + (f" — {shares}" if shares else ""))
+
+
 def print_grade(grade: str):
     """Print the grade with appropriate drama."""
     c = COLORS
@@ -143,6 +154,8 @@ def format_full_output(result: dict, filename: str) -> int:
 
     # Summary
     print_summary(result.get("summary", ""))
+    if "votes" in result:
+        print_votes(result["votes"])
 
     # Grade
     grade = result["grade"]
@@ -155,3 +168,21 @@ def format_full_output(result: dict, filename: str) -> int:
         return 0
     else:
         return 1
+
+
+def print_profile(metrics: dict):
+    """Print where the run spent its time and tokens (see metrics.Metrics.as_dict)."""
+    c = COLORS
+    out = sys.stderr
+    print(file=out)
+    print(f"{c['info']}{'─' * 60}{c['reset']}", file=out)
+    print(f"{c['bold']}Profile:{c['reset']}", file=out)
+    for name, seconds in metrics["phases"].items():
+        print(f"  {name:<14} {seconds:8.3f}s", file=out)
+    for purpose, r in metrics["requests"].items():
+        print(f"    {purpose:<12} {r['seconds']:8.3f}s  {r['requests']} request(s), "
+              f"{r['prompt_tokens']} prompt + {r['completion_tokens']} completion tokens", file=out)
+    print(f"  {'total':<14} {metrics['total_seconds']:8.3f}s  "
+          f"{metrics['prompt_tokens']} prompt + {metrics['completion_tokens']} completion tokens",
+          file=out)
+    print(f"{c['info']}{'─' * 60}{c['reset']}", file=out)
@@ -10,10 +10,28 @@ This dramatically improves accuracy because GPT reasons about correctness
 before committing to a grade, rather than jumping to conclusions.
 """
 
+from __future__ import annotations
+
+import contextvars
 import json
-from openai import OpenAI
+import queue
+import re
+import threading
+import time
+from collections import Counter
+from typing import TYPE_CHECKING
+
+from .config import (
+    OPENAI_API_KEY, OPENAI_MODEL, PROMPT_FILE, ALL_GRADES, COMPLETION_TOKENS_ESTIMATE,
+    VOTE_TEMPERATURE,
+)
+from .ratelimit import call_with_retries
+from .cache import DiskCache, cache_key
+from .session import get_client, needs_api_key
+from .metrics import record_request
 
-from .config import OPENAI_API_KEY, OPENAI_MODEL, PROMPT_FILE, ALL_GRADES
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 
 class GPTError(Exception):
@@ -21,6 +39,10 @@ class GPTError(Exception):
     pass
 
 
+class VerdictError(GPTError):
+    """GPT answered, but not with a usable verdict (bad JSON, missing or unknown grade)."""
+
+
 def load_prompt_template() -> str:
     """Load the prompt template from disk."""
     return PROMPT_FILE.read_text(encoding="utf-8")
@@ -49,7 +71,7 @@ Key principles:
 - Invariants/variants should be annotated BEFORE or INSIDE the loop they refer to.
 """
 
-ANALYSIS_PROMPT = """\
+ANALYSIS_METHODOLOGY = """\
 Carefully analyse the following Scala program's loop invariants and variants.
 
 You MUST follow this EXACT verification methodology for EACH loop:
@@ -117,18 +139,27 @@ Here is the program:
 ```scala
 {source_code}
 ```
+"""
 
+ANALYSIS_PROMPT = ANALYSIS_METHODOLOGY + """
 Provide your detailed step-by-step analysis following the methodology above. \
 Do NOT output JSON yet. Be thorough — your reputation depends on it.
 """
 
+PRECHECK_NOTE = """
+NOTE: A static pre-check has already established that the loops starting on \
+lines {unannotated} have NO invariant or variant annotations. Do not trace \
+those loops; concentrate your analysis on the annotated loops on lines \
+{annotated}. The missing annotations must still count against the grade.
+"""
+
 JUDGEMENT_SYSTEM = (
     "You are INVSC, the Invariant Scala Compiler. Based on the analysis provided, "
     "you produce a final JSON verdict. You respond ONLY in valid JSON. "
     "No markdown fences, no extra text."
 )
 
-JUDGEMENT_PROMPT = """\
+JUDGEMENT_RUBRIC = """\
 Based on your analysis above, now produce the final verdict.
 
 CRITICAL RULES for grading:
@@ -175,7 +206,9 @@ KEY CALIBRATION POINTS:
 - Missing annotations on correct code = beta or betagamma, NOT gamma.
 - One informal/unclear variant on otherwise correct annotations = alpha(-) or alphabeta.
 - Gamma is ONLY for code that is fundamentally broken or nonsensical.
+"""
 
+VERDICT_FORMAT = """
 Respond in this JSON format ONLY:
 {
   "grade": "alpha|alpha(-)|alphabeta|betaalpha|beta|betagamma|gammabeta|gamma",
@@ -190,95 +223,564 @@ Respond in this JSON format ONLY:
 }
 """
 
+JUDGEMENT_PROMPT = JUDGEMENT_RUBRIC + VERDICT_FORMAT
+
+LOOPS_NOTE = """
+NOTE: The program above is an excerpt. Every line is prefixed with its line \
+number in the original file; always refer to lines by those numbers. Analyse \
+ONLY the loops starting on lines {lines}.
+"""
+
+SHARD_NOTE = """
+NOTE: The program above is one part of a larger file. Every line is prefixed \
+with its line number in the original file; always refer to lines by those \
+numbers. Lines marked "..." are omitted. Analyse ONLY the loops starting on \
+lines {lines}; the rest is context.
+"""
 
-def query_gpt(source_code: str, api_key: str | None = None, model: str | None = None) -> dict:
+LOOP_VERDICT_FORMAT = """
+Grade EACH loop you analysed on its own, using the same scale, and respond in \
+this JSON format ONLY:
+{
+  "grade": "<overall grade for the excerpt>",
+  "summary": "A brief overall summary (1-2 sentences, in the tone of an Oxford tutor)",
+  "loops": [
+    {
+      "line": <line_number_the_loop_starts_on>,
+      "grade": "alpha|alpha(-)|alphabeta|betaalpha|beta|betagamma|gammabeta|gamma",
+      "warnings": [
+        {
+          "line": <line_number_or_null>,
+          "severity": "warning|error",
+          "message": "description of the issue"
+        }
+      ]
+    }
+  ]
+}
+"""
+
+LOOP_JUDGEMENT_PROMPT = JUDGEMENT_RUBRIC + LOOP_VERDICT_FORMAT
+
+# Single-pass mode: the analysis and the verdict come back in one structured response
+SINGLE_PASS_INSTRUCTIONS = """
+Write your detailed step-by-step analysis, following the methodology above, in \
+the "analysis" field FIRST. Be thorough — your reputation depends on it. Only \
+then fill in the verdict fields, which must agree with your analysis.
+
+"""
+
+SINGLE_PASS_PROMPT = ANALYSIS_METHODOLOGY + SINGLE_PASS_INSTRUCTIONS + JUDGEMENT_RUBRIC
+
+SINGLE_PASS_SCHEMA = {
+    "name": "invsc_verdict",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "analysis": {"type": "string"},
+            "grade": {"type": "string", "enum": ALL_GRADES},
+            "summary": {"type": "string"},
+            "warnings": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "line": {"type": ["integer", "null"]},
+                        "severity": {"type": "string", "enum": ["warning", "error"]},
+                        "message": {"type": "string"},
+                    },
+                    "required": ["line", "severity", "message"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["analysis", "grade", "summary", "warnings"],
+        "additionalProperties": False,
+    },
+}
+
+
+verdict_cache = DiskCache("verdicts")
+analysis_cache = DiskCache("analyses")
+
+
+def verdict_cache_key(source_code: str, model: str, notes: str = "", votes: int = 1) -> str:
+    """Cache key for a full verdict: changes whenever the code, model or any prompt changes."""
+    extra = (f"votes:{votes}:{VOTE_TEMPERATURE}",) if votes > 1 else ()
+    return cache_key(
+        "verdict", model, source_code, notes,
+        ANALYSIS_SYSTEM, ANALYSIS_PROMPT, JUDGEMENT_SYSTEM, JUDGEMENT_PROMPT, *extra,
+    )
+
+
+def analysis_cache_key(analysis_prompt: str, model: str) -> str:
     """
-    Send the source code to GPT for invariant checking using two-pass approach.
+    Cache key for a pass-1 analysis. Deliberately excludes the judgement prompts,
+    so recalibrating the rubric only re-runs pass 2.
+    """
+    return cache_key("analysis", model, ANALYSIS_SYSTEM, analysis_prompt)
 
-    Pass 1: Deep analysis with chain-of-thought reasoning
-    Pass 2: Structured JSON judgement based on the analysis
 
-    Returns a dict with keys: grade, summary, warnings, analysis
+def is_transient(error: Exception) -> bool:
+    """Whether a failed request is worth retrying: rate limits, server errors, dropped connections."""
+    from openai import APIConnectionError  # already loaded: a request was made
+
+    if isinstance(error, APIConnectionError):  # includes timeouts
+        return True
+    status = getattr(error, "status_code", None)
+    return status in (408, 409, 429) or (status is not None and status >= 500)
+
+
+def estimate_tokens(messages: list[dict]) -> int:
+    """Rough token cost of a request: ~4 characters per prompt token plus the expected completion."""
+    return sum(len(m["content"]) for m in messages) // 4 + COMPLETION_TOKENS_ESTIMATE
+
+
+def create_completion(client: OpenAI, purpose: str = "request", **kwargs):
     """
-    key = api_key or OPENAI_API_KEY
-    mdl = model or OPENAI_MODEL
+    Every chat completion goes through here, so that all requests share the
+    rate limiter and are retried on transient errors (see ratelimit.py), and
+    so that their time and token usage are recorded under `purpose` (see
+    metrics.py). A stream is recorded once it has been read to the end.
+    """
+    completions = client.chat.completions
+    start = time.perf_counter()
 
-    if not key:
-        raise GPTError(
-            "No OpenAI API key found. Set OPENAI_API_KEY environment variable "
-            "or pass --api-key flag."
-        )
+    def send():
+        raw_api = getattr(completions, "with_raw_response", None)
+        if raw_api is None:
+            return completions.create(**kwargs), None
+        raw = raw_api.create(**kwargs)
+        return raw.parse(), raw.headers
 
-    client = OpenAI(api_key=key)
+    try:
+        response = call_with_retries(send, estimate_tokens(kwargs["messages"]), is_transient)
+    except Exception as e:
+        if is_transient(e):
+            raise GPTError(f"OpenAI request failed after retrying: {e}")
+        raise
 
-    # --- Pass 1: Analysis ---
-    analysis_prompt = ANALYSIS_PROMPT.format(source_code=source_code)
-
-    analysis_response = client.chat.completions.create(
-        model=mdl,
-        messages=[
-            {"role": "system", "content": ANALYSIS_SYSTEM},
-            {"role": "user", "content": analysis_prompt},
-        ],
-        temperature=0.2,
+    if kwargs.get("stream"):
+        return _recorded_stream(response, purpose, start)
+    record_request(purpose, time.perf_counter() - start, getattr(response, "usage", None))
+    return response
+
+
+def _recorded_stream(stream, purpose: str, start: float):
+    """Pass the chunks through, then record the request with the usage from the last chunk."""
+    usage = None
+    for chunk in stream:
+        usage = getattr(chunk, "usage", None) or usage
+        yield chunk
+    record_request(purpose, time.perf_counter() - start, usage)
+
+
+def run_analysis(client: OpenAI, analysis_prompt: str, model: str, on_token=None,
+                 temperature: float = 0.2) -> str:
+    """
+    Pass 1: ask GPT for a step-by-step analysis of the program.
+    If on_token is given, the analysis is streamed and each piece of text is
+    passed to it as soon as it arrives.
+    """
+    messages = [
+        {"role": "system", "content": ANALYSIS_SYSTEM},
+        {"role": "user", "content": analysis_prompt},
+    ]
+
+    if on_token is None:
+        analysis_response = create_completion(
+            client,
+            "analysis",
+            model=model,
+            messages=messages,
+            temperature=temperature,
+        )
+        return analysis_response.choices[0].message.content.strip()
+
+    stream = create_completion(
+        client,
+        "analysis",
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        stream=True,
+        stream_options={"include_usage": True},
     )
+    parts = []
+    for chunk in stream:
+        text = chunk.choices[0].delta.content if chunk.choices else None
+        if text:
+            parts.append(text)
+            on_token(text)
+    return "".join(parts).strip()
 
-    analysis = analysis_response.choices[0].message.content.strip()
 
-    # --- Pass 2: Judgement (with analysis as context) ---
-    judgement_response = client.chat.completions.create(
-        model=mdl,
-        messages=[
-            {"role": "system", "content": JUDGEMENT_SYSTEM},
-            {"role": "user", "content": analysis_prompt},
-            {"role": "assistant", "content": analysis},
-            {"role": "user", "content": JUDGEMENT_PROMPT},
-        ],
+GRADE_FIELD_RE = re.compile(r'"grade"\s*:\s*"([^"]*)"')
+
+
+def run_judgement(client: OpenAI, analysis_prompt: str, analysis: str, model: str,
+                  judgement_prompt: str | None = None, on_grade=None) -> str:
+    """
+    Pass 2: turn the analysis into the raw JSON verdict.
+    If on_grade is given, the verdict is streamed and on_grade is called with
+    the normalised grade as soon as the "grade" field is complete, before the
+    summary and warnings have arrived.
+    """
+    messages = [
+        {"role": "system", "content": JUDGEMENT_SYSTEM},
+        {"role": "user", "content": analysis_prompt},
+        {"role": "assistant", "content": analysis},
+        {"role": "user", "content": judgement_prompt or JUDGEMENT_PROMPT},
+    ]
+
+    if on_grade is None:
+        judgement_response = create_completion(
+            client,
+            "judgement",
+            model=model,
+            messages=messages,
+            temperature=0.1,
+            response_format={"type": "json_object"},
+        )
+        return judgement_response.choices[0].message.content.strip()
+
+    stream = create_completion(
+        client,
+        "judgement",
+        model=model,
+        messages=messages,
         temperature=0.1,
         response_format={"type": "json_object"},
+        stream=True,
+        stream_options={"include_usage": True},
     )
+    raw = ""
+    announced = False
+    for chunk in stream:
+        text = chunk.choices[0].delta.content if chunk.choices else None
+        if not text:
+            continue
+        raw += text
+        if not announced:
+            match = GRADE_FIELD_RE.search(raw)
+            if match:
+                announced = True
+                on_grade(normalise_grade(match.group(1)))
+    return raw.strip()
+
+
+GRADE_ALIASES = {
+    "alpha-": "alpha(-)",
+    "alpha_minus": "alpha(-)",
+    "alpha_beta": "alphabeta",
+    "alpha-beta": "alphabeta",
+    "beta_alpha": "betaalpha",
+    "beta-alpha": "betaalpha",
+    "beta_gamma": "betagamma",
+    "beta-gamma": "betagamma",
+    "gamma_beta": "gammabeta",
+    "gamma-beta": "gammabeta",
+}
 
-    raw = judgement_response.choices[0].message.content.strip()
 
+def normalise_grade(grade: str) -> str:
+    """Normalise GPT's spelling of a grade, e.g. 'Alpha-Beta' -> 'alphabeta'."""
+    grade = str(grade).strip().lower().replace(" ", "")
+    return GRADE_ALIASES.get(grade, grade)
+
+
+def parse_verdict(raw: str) -> dict:
+    """Parse and normalise the JSON verdict from pass 2."""
     try:
         result = json.loads(raw)
     except json.JSONDecodeError as e:
-        raise GPTError(f"GPT returned invalid JSON: {e}\nRaw response:\n{raw}")
+        raise VerdictError(f"GPT returned invalid JSON: {e}\nRaw response:\n{raw}")
 
     # Validate expected keys
     if "grade" not in result:
-        raise GPTError(f"GPT response missing 'grade' field:\n{raw}")
+        raise VerdictError(f"GPT response missing 'grade' field:\n{raw}")
     if "warnings" not in result:
         result["warnings"] = []
     if "summary" not in result:
         result["summary"] = ""
 
-    # Normalize grade
-    result["grade"] = result["grade"].strip().lower().replace(" ", "")
-
-    # Handle common GPT variations
-    grade_aliases = {
-        "alpha-": "alpha(-)",
-        "alpha_minus": "alpha(-)",
-        "alpha_beta": "alphabeta",
-        "alpha-beta": "alphabeta",
-        "beta_alpha": "betaalpha",
-        "beta-alpha": "betaalpha",
-        "beta_gamma": "betagamma",
-        "beta-gamma": "betagamma",
-        "gamma_beta": "gammabeta",
-        "gamma-beta": "gammabeta",
+    result["grade"] = normalise_grade(result["grade"])
+    if result["grade"] not in ALL_GRADES:
+        raise VerdictError(
+            f"GPT returned unknown grade '{result['grade']}'. "
+            f"Expected one of: {set(ALL_GRADES)}\nRaw response:\n{raw}"
+        )
+
+    return result
+
+
+def draw_votes(draw, votes: int) -> dict:
+    """
+    Self-consistency: call draw(stop) (one complete grading, returning a
+    verdict) `votes` times concurrently and return as soon as more than half
+    of the verdicts agree on a grade, without waiting for the rest. If no
+    grade wins a majority, all samples are awaited and the most common grade
+    wins, ties going to the worse grade.
+
+    `stop` is a threading.Event set once the vote is decided: a draw should
+    check it between requests and give up early, since its verdict will be
+    ignored. Samples run on daemon threads, so any still in flight neither
+    delay the return nor hold up process exit.
+
+    The verdict returned is the first sample with the winning grade, plus
+    "votes": {"requested", "samples" (how many were awaited), "grades"
+    (grade -> count) and "agreement" (the winning share of the samples)}.
+    Samples that fail are left out; if all of them fail, the first error is
+    raised.
+    """
+    quorum = votes // 2 + 1
+    samples, errors = [], []
+    done = queue.SimpleQueue()
+    stop = threading.Event()
+
+    def run(context: contextvars.Context):
+        try:
+            done.put((context.run(draw, stop), None))
+        except Exception as e:
+            done.put((None, e))
+
+    # Each sample's requests still count towards this run's metrics
+    for _ in range(votes):
+        threading.Thread(target=run, args=(contextvars.copy_context(),), daemon=True).start()
+    try:
+        for _ in range(votes):
+            verdict, error = done.get()
+            if error is not None:
+                errors.append(error)
+                continue
+            samples.append(verdict)
+            if Counter(v["grade"] for v in samples).most_common(1)[0][1] >= quorum:
+                break
+    finally:
+        stop.set()
+
+    if not samples:
+        raise errors[0]
+
+    counts = Counter(v["grade"] for v in samples)
+    most = max(counts.values())
+    grade = max((g for g, n in counts.items() if n == most), key=ALL_GRADES.index)
+    chosen = next(v for v in samples if v["grade"] == grade)
+    return {
+        **chosen,
+        "votes": {
+            "requested": votes,
+            "samples": len(samples),
+            "grades": dict(counts),
+            "agreement": round(most / len(samples), 3),
+        },
     }
-    result["grade"] = grade_aliases.get(result["grade"], result["grade"])
 
-    valid_grades = set(ALL_GRADES)
-    if result["grade"] not in valid_grades:
+
+def resolve_client(key: str, client: OpenAI | None = None) -> OpenAI:
+    """Return the given client, or the shared pooled client for the API key."""
+    if client is not None:
+        return client
+    if not key and needs_api_key():
         raise GPTError(
-            f"GPT returned unknown grade '{result['grade']}'. "
-            f"Expected one of: {valid_grades}\nRaw response:\n{raw}"
+            "No OpenAI API key found. Set OPENAI_API_KEY environment variable "
+            "or pass --api-key flag."
         )
+    return get_client(key)
+
+
+def cached_analysis(client: OpenAI, analysis_prompt: str, model: str, use_cache: bool,
+                    on_token=None) -> str:
+    """Pass 1, served from the analysis cache when possible."""
+    analysis_id = analysis_cache_key(analysis_prompt, model)
+    if use_cache:
+        stored = analysis_cache.get(analysis_id)
+        if stored is not None:
+            if on_token is not None:
+                on_token(stored["analysis"])
+            return stored["analysis"]
+
+    analysis = run_analysis(client, analysis_prompt, model, on_token=on_token)
+    if use_cache:
+        analysis_cache.put(analysis_id, {"analysis": analysis})
+    return analysis
+
+
+def query_gpt(source_code: str, api_key: str | None = None, model: str | None = None,
+              client: OpenAI | None = None, use_cache: bool = True, notes: str = "",
+              on_analysis_token=None, on_grade=None, votes: int = 1) -> dict:
+    """
+    Send the source code to GPT for invariant checking using two-pass approach.
+
+    Pass 1: Deep analysis with chain-of-thought reasoning
+    Pass 2: Structured JSON judgement based on the analysis
+
+    Unless a client is passed in, the process-wide pooled client for the API
+    key is used, so repeated calls reuse open connections.
+
+    Verdicts are cached on disk, so re-grading an unchanged file with the same
+    model and prompts returns instantly without touching the network. Pass-1
+    analyses are cached separately, so a change to the judgement prompt only
+    pays for pass 2.
+
+    Extra notes (e.g. static pre-check findings) are appended to the analysis prompt.
+
+    on_analysis_token streams pass 1 as it is generated; on_grade receives the
+    grade from pass 2 as soon as it appears (see run_analysis / run_judgement).
+    Neither is called on a verdict cache hit.
+
+    With votes > 1, that many analyses are sampled at VOTE_TEMPERATURE and
+    judged concurrently, and the majority verdict is returned (see
+    draw_votes); the streaming callbacks are not used.
+
+    Returns a dict with keys: grade, summary, warnings, analysis (and votes)
+    """
+    key = api_key or OPENAI_API_KEY
+    mdl = model or OPENAI_MODEL
+
+    cache_id = verdict_cache_key(source_code, mdl, notes, votes)
+    if use_cache:
+        cached = verdict_cache.get(cache_id)
+        if cached is not None:
+            return cached
+
+    client = resolve_client(key, client)
+
+    # --- Pass 1: Analysis ---
+    analysis_prompt = ANALYSIS_PROMPT.format(source_code=source_code) + notes
+
+    if votes > 1:
+        def sample(stop: threading.Event) -> dict | None:
+            analysis = run_analysis(client, analysis_prompt, mdl, temperature=VOTE_TEMPERATURE)
+            if stop.is_set():
+                return None  # the vote is already decided; skip pass 2
+            verdict = parse_verdict(run_judgement(client, analysis_prompt, analysis, mdl))
+            verdict["analysis"] = analysis
+            return verdict
+
+        result = draw_votes(sample, votes)
+        if use_cache:
+            verdict_cache.put(cache_id, result)
+        return result
+
+    analysis = cached_analysis(client, analysis_prompt, mdl, use_cache, on_token=on_analysis_token)
+
+    # --- Pass 2: Judgement (with analysis as context) ---
+    raw = run_judgement(client, analysis_prompt, analysis, mdl, on_grade=on_grade)
+    result = parse_verdict(raw)
 
     # Attach the analysis for debugging / verbose output
     result["analysis"] = analysis
 
+    if use_cache:
+        verdict_cache.put(cache_id, result)
+
+    return result
+
+
+def single_verdict_cache_key(source_code: str, model: str, notes: str = "", votes: int = 1) -> str:
+    """Cache key for a single-pass verdict."""
+    extra = (f"votes:{votes}:{VOTE_TEMPERATURE}",) if votes > 1 else ()
+    return cache_key(
+        "single", model, source_code, notes, ANALYSIS_SYSTEM, SINGLE_PASS_PROMPT,
+        json.dumps(SINGLE_PASS_SCHEMA, sort_keys=True), *extra,
+    )
+
+
+def query_gpt_single(source_code: str, api_key: str | None = None, model: str | None = None,
+                     client: OpenAI | None = None, use_cache: bool = True,
+                     notes: str = "", votes: int = 1) -> dict:
+    """
+    Grade the source in ONE request: the analysis and the verdict come back
+    together as structured output. Half the round trips of query_gpt, at the
+    cost of the model committing to its verdict format while still reasoning.
+
+    With votes > 1, that many verdicts are sampled at VOTE_TEMPERATURE
+    concurrently and the majority one is returned (see draw_votes).
+
+    Returns a dict with keys: grade, summary, warnings, analysis (and votes)
+    """
+    key = api_key or OPENAI_API_KEY
+    mdl = model or OPENAI_MODEL
+
+    cache_id = single_verdict_cache_key(source_code, mdl, notes, votes)
+    if use_cache:
+        cached = verdict_cache.get(cache_id)
+        if cached is not None:
+            return cached
+
+    client = resolve_client(key, client)
+
+    def sample(temperature: float) -> dict:
+        response = create_completion(
+            client,
+            "single-pass",
+            model=mdl,
+            messages=[
+                {"role": "system", "content": ANALYSIS_SYSTEM},
+                {"role": "user", "content": SINGLE_PASS_PROMPT.format(source_code=source_code) + notes},
+            ],
+            temperature=temperature,
+            response_format={"type": "json_schema", "json_schema": SINGLE_PASS_SCHEMA},
+        )
+        raw = response.choices[0].message.content.strip()
+        verdict = parse_verdict(raw)
+        verdict["analysis"] = str(verdict.get("analysis", "")).strip()
+        return verdict
+
+    if votes > 1:
+        result = draw_votes(lambda stop: sample(VOTE_TEMPERATURE), votes)
+    else:
+        result = sample(0.1)
+
+    if use_cache:
+        verdict_cache.put(cache_id, result)
+
     return result
+
+
+def number_lines(source_code: str, first_line: int = 1) -> str:
+    """Prefix every line with its line number, so excerpts keep their original numbering."""
+    return "\n".join(
+        f"{n:>4} | {line}" for n, line in enumerate(source_code.splitlines(), start=first_line)
+    )
+
+
+def query_loops(excerpt: str, loop_lines: list[int], api_key: str | None = None,
+                model: str | None = None, client: OpenAI | None = None,
+                use_cache: bool = True) -> dict:
+    """
+    Grade only the given loops, each on its own.
+
+    The excerpt must already carry original line numbers (see number_lines).
+    Returns a dict with keys: grade, summary, analysis, and loops — a mapping
+    from each loop's starting line to {"grade", "warnings"}. Loops GPT did not
+    grade are missing from the mapping.
+    """
+    key = api_key or OPENAI_API_KEY
+    mdl = model or OPENAI_MODEL
+    client = resolve_client(key, client)
+
+    analysis_prompt = (ANALYSIS_PROMPT.format(source_code=excerpt)
+                       + LOOPS_NOTE.format(lines=", ".join(str(n) for n in loop_lines)))
+    analysis = cached_analysis(client, analysis_prompt, mdl, use_cache)
+
+    raw = run_judgement(client, analysis_prompt, analysis, mdl,
+                        judgement_prompt=LOOP_JUDGEMENT_PROMPT)
+    result = parse_verdict(raw)
+
+    loops = {}
+    for entry in result.get("loops") or []:
+        if not isinstance(entry, dict) or entry.get("line") not in loop_lines:
+            continue
+        grade = normalise_grade(entry.get("grade", ""))
+        if grade in ALL_GRADES:
+            loops[entry["line"]] = {"grade": grade, "warnings": entry.get("warnings") or []}
+
+    return {
+        "grade": result["grade"],
+        "summary": result["summary"],
+        "analysis": analysis,
+        "loops": loops,
+    }
@@ -0,0 +1,280 @@
+"""
+Grading pipeline for INVSC — decides how much of a file actually needs GPT.
+
+The static pre-check runs first. If no loop carries any annotation the grade
+is already certain and no request is made at all; otherwise GPT is told which
+loops are unannotated so that it only has to reason about the rest. Large
+files are split into shards at method boundaries and graded concurrently.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import TYPE_CHECKING
+
+from .config import (
+    ALL_GRADES, PASSING_GRADES, FAILING_GRADES, SHARD_LINES, BATCH_CONCURRENCY,
+    OPENAI_MODEL, CASCADE_MODEL,
+)
+from .gpt_client import query_gpt, query_gpt_single, VerdictError, PRECHECK_NOTE, SHARD_NOTE
+from .scanner import precheck, find_loops, is_unannotated
+from .shard import split_shards
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+
+PRECHECK_GRADE = "betagamma"
+PRECHECK_SUMMARY = (
+    "Not a single loop bears an invariant or a variant. One cannot mark what "
+    "one has not been shown."
+)
+
+
+# The grades either side of the pass line: a cheap model's verdict there
+# decides pass or fail on too thin a margin to be trusted (see grade_cascade)
+BORDERLINE_GRADES = {
+    max(PASSING_GRADES, key=ALL_GRADES.index),
+    min(FAILING_GRADES, key=ALL_GRADES.index),
+}
+
+# Findings in an analysis that a passing grade cannot coexist with: an
+# invariant or variant said, within the same sentence, to be broken or
+# marked INCORRECT in the final verdict. "The loop does not terminate when
+# i == n" is ordinary reasoning about the exit condition, not a defect. A
+# period only ends the sentence when followed by a space, so code like
+# `arr.length` doesn't.
+DEFECT_RE = re.compile(
+    r"\b(?:in)?variants?\b(?:[^.!?\n]|[.!?](?=\S))*?"
+    r"(?:\b(?:is|are)\s+not\s+(?:preserved|maintained|established|valid|correct)\b"
+    r"|\b(?:does|do)\s+not\s+(?:hold|decrease|imply)\b"
+    r"|\b(?:is|are)\s+violated\b|\bfails?\s+to\s+(?:hold|decrease)\b"
+    r"|(?-i:\bINCORRECT\b))",
+    re.IGNORECASE,
+)
+
+
+def compose_grades(grades: list[str]) -> str:
+    """
+    Combine the grades of separately graded parts of a file into one grade:
+    the mean position on ALL_GRADES, rounded towards the worse grade. A file
+    with any failing part fails: good parts can't average a broken or
+    unannotated one into a pass, just as the rubric puts one loop without
+    annotations among well-annotated ones below the pass line.
+    """
+    positions = [ALL_GRADES.index(g) for g in grades]
+    composed = -(-sum(positions) // len(positions))
+    if any(g in FAILING_GRADES for g in grades):
+        composed = max(composed, min(ALL_GRADES.index(g) for g in FAILING_GRADES))
+    return ALL_GRADES[composed]
+
+
+def local_verdict(report: dict) -> dict:
+    """The verdict for a file whose loops are all unannotated, without asking GPT."""
+    lines = ", ".join(str(lp["line"]) for lp in report["loops"])
+    return {
+        "grade": PRECHECK_GRADE,
+        "summary": PRECHECK_SUMMARY,
+        "warnings": report["warnings"],
+        "analysis": (
+            f"Static pre-check: the loops on lines {lines} have no invariant or "
+            f"variant annotations, so the grade is at most {PRECHECK_GRADE}. "
+            f"GPT was not consulted."
+        ),
+    }
+
+
+def merge_warnings(result: dict, extra: list[dict]) -> dict:
+    """Add pre-check warnings for lines GPT did not already comment on."""
+    seen = {w.get("line") for w in result.get("warnings", [])}
+    warnings = result.get("warnings", []) + [w for w in extra if w["line"] not in seen]
+    warnings.sort(key=lambda w: w.get("line") or 0)
+    return {**result, "warnings": warnings}
+
+
+def precheck_notes(loops: list[dict]) -> str:
+    """Tell GPT which of these loops the pre-check found unannotated."""
+    unannotated = {lp["line"] for lp in loops if is_unannotated(lp)}
+    if not unannotated:
+        return ""
+    return PRECHECK_NOTE.format(
+        unannotated=", ".join(str(n) for n in sorted(unannotated)),
+        annotated=", ".join(str(lp["line"]) for lp in loops if lp["line"] not in unannotated),
+    )
+
+
+def grade_sharded(shards: list[dict], api_key: str | None = None, model: str | None = None,
+                  client: OpenAI | None = None, use_cache: bool = True,
+                  use_precheck: bool = True, single_pass: bool = False, votes: int = 1) -> dict:
+    """
+    Grade each shard concurrently and merge the verdicts.
+
+    The grade is composed from the shard grades, so one failing shard fails
+    the whole file as it would if graded in one piece. The summary is taken
+    from the worst shard, which is therefore on the same side of the pass
+    line as the grade. Warnings keep the original line numbers. With votes,
+    the file's agreement is that of its least settled shard.
+    """
+    def grade_shard(shard: dict) -> dict:
+        notes = SHARD_NOTE.format(lines=", ".join(str(lp["line"]) for lp in shard["loops"]))
+        report = precheck(shard["text"], loops=shard["loops"]) if use_precheck else None
+        if report:
+            if report["certain"]:
+                return local_verdict(report)
+            notes += precheck_notes(shard["loops"])
+
+        ask = query_gpt_single if single_pass else query_gpt
+        result = ask(shard["text"], api_key=api_key, model=model, client=client,
+                     use_cache=use_cache, notes=notes, votes=votes)
+        # A line outside the shard can't be right; keep it as a file-level remark
+        first, last = shard["first"], shard["last"]
+        result["warnings"] = [
+            {**w, "line": w.get("line") if isinstance(w.get("line"), int)
+             and first <= w["line"] <= last else None}
+            for w in result.get("warnings", [])
+        ]
+        return merge_warnings(result, report["warnings"]) if report else result
+
+    with ThreadPoolExecutor(max_workers=max(1, min(len(shards), BATCH_CONCURRENCY))) as pool:
+        # Each shard's requests still count towards this run's metrics
+        futures = [pool.submit(contextvars.copy_context().run, grade_shard, shard)
+                   for shard in shards]
+        verdicts = [f.result() for f in futures]
+
+    worst = max(verdicts, key=lambda v: ALL_GRADES.index(v["grade"]))
+    warnings = [w for v in verdicts for w in v.get("warnings", [])]
+    warnings.sort(key=lambda w: w.get("line") or 0)
+    result = {
+        "grade": compose_grades([v["grade"] for v in verdicts]),
+        "summary": worst.get("summary", ""),
+        "warnings": warnings,
+        "analysis": "\n\n".join(
+            f"## Lines {sh['first']}-{sh['last']}\n{v.get('analysis', '')}"
+            for sh, v in zip(shards, verdicts)
+        ),
+    }
+    voted = [v["votes"] for v in verdicts if "votes" in v]
+    if voted:
+        result["votes"] = {
+            "requested": votes,
+            "samples": sum(v["samples"] for v in voted),
+            "agreement": min(v["agreement"] for v in voted),
+        }
+    return result
+
+
+def grade_source(source_code: str, api_key: str | None = None, model: str | None = None,
+                 client: OpenAI | None = None, use_cache: bool = True,
+                 use_precheck: bool = True, single_pass: bool = False,
+                 on_analysis_token=None, on_grade=None, votes: int = 1,
+                 cascade: bool = False, cheap_model: str | None = None) -> dict:
+    """
+    Grade a Scala source, running the static pre-check before query_gpt
+    (or query_gpt_single in single-pass mode). Files longer than SHARD_LINES
+    are graded in concurrent shards.
+
+    The streaming callbacks are passed on to query_gpt; they are only used
+    when the file is graded in one two-pass request without votes.
+
+    With cascade, see grade_cascade.
+
+    Returns a dict with keys: grade, summary, warnings, analysis
+    """
+    if cascade:
+        return grade_cascade(source_code, api_key=api_key, model=model, client=client,
+                             use_cache=use_cache, use_precheck=use_precheck,
+                             single_pass=single_pass, votes=votes, cheap_model=cheap_model,
+                             on_analysis_token=on_analysis_token, on_grade=on_grade)
+
+    report = precheck(source_code) if use_precheck else None
+    if report and report["certain"]:
+        return local_verdict(report)
+
+    if SHARD_LINES and len(source_code.splitlines()) > SHARD_LINES:
+        loops = report["loops"] if report else find_loops(source_code)
+        shards = split_shards(source_code, SHARD_LINES, loops=loops)
+        # Only shard when every loop lands in some shard
+        covered = sum(len(sh["loops"]) for sh in shards) == len(loops)
+        if len(shards) > 1 and covered:
+            return grade_sharded(shards, api_key=api_key, model=model, client=client,
+                                 use_cache=use_cache, use_precheck=use_precheck,
+                                 single_pass=single_pass, votes=votes)
+
+    if single_pass:
+        ask = partial(query_gpt_single, votes=votes)
+    else:
+        ask = partial(query_gpt, on_analysis_token=on_analysis_token, on_grade=on_grade,
+                      votes=votes)
+
+    if report is None:
+        return ask(source_code, api_key=api_key, model=model, client=client, use_cache=use_cache)
+
+    result = ask(source_code, api_key=api_key, model=model, client=client,
+                 use_cache=use_cache, notes=precheck_notes(report["loops"]))
+    return merge_warnings(result, report["warnings"])
+
+
+def escalation_reason(result: dict) -> str | None:
+    """
+    Why a verdict from the cheap tier should not stand, or None if it can:
+    a grade next to the pass line, or an analysis that contradicts its
+    grade (a pass despite errors or broken invariants, a fail with nothing
+    wrong).
+    """
+    grade = result["grade"]
+    if grade in BORDERLINE_GRADES:
+        return f"borderline grade {grade}"
+
+    errors = [w for w in result.get("warnings", []) if w.get("severity") == "error"]
+    defect = DEFECT_RE.search(result.get("analysis", ""))
+    if grade in PASSING_GRADES and errors:
+        return f"passing grade {grade} with {len(errors)} error(s)"
+    if grade in PASSING_GRADES and defect:
+        finding = " ".join(defect.group(0).split())
+        return f"passing grade {grade} but the analysis finds: {finding[:80]}"
+    if grade in FAILING_GRADES and not result.get("warnings") and not defect:
+        return f"failing grade {grade} with no fault found"
+    return None
+
+
+def grade_cascade(source_code: str, api_key: str | None = None, model: str | None = None,
+                  client: OpenAI | None = None, use_cache: bool = True,
+                  use_precheck: bool = True, single_pass: bool = False, votes: int = 1,
+                  cheap_model: str | None = None, on_analysis_token=None, on_grade=None) -> dict:
+    """
+    Grade with the cheap model (CASCADE_MODEL) first and escalate to the main
+    model only when that verdict can't be trusted (see escalation_reason) or
+    isn't a usable verdict at all. Files the pre-check settles never reach
+    either model.
+
+    The result records which tier decided it under "cascade": {"tier"
+    ("precheck", "cheap" or "strong"), "model", and for escalations
+    "escalated" (why) and "cheap_grade"}. The streaming callbacks only
+    follow the strong tier.
+    """
+    options = dict(api_key=api_key, client=client, use_cache=use_cache,
+                   use_precheck=use_precheck, single_pass=single_pass, votes=votes)
+    cheap = cheap_model or CASCADE_MODEL
+    strong = model or OPENAI_MODEL
+
+    report = precheck(source_code) if use_precheck else None
+    if report and report["certain"]:
+        return {**local_verdict(report), "cascade": {"tier": "precheck", "model": None}}
+
+    cheap_grade = None
+    try:
+        result = grade_source(source_code, model=cheap, **options)
+        cheap_grade = result["grade"]
+        reason = escalation_reason(result)
+    except VerdictError as e:
+        reason = f"unusable verdict: {str(e).splitlines()[0]}"
+    if reason is None:
+        return {**result, "cascade": {"tier": "cheap", "model": cheap}}
+
+    result = grade_source(source_code, model=strong, on_analysis_token=on_analysis_token,
+                          on_grade=on_grade, **options)
+    return {**result, "cascade": {"tier": "strong", "model": strong, "escalated": reason,
+                                  "cheap_grade": cheap_grade}}
@@ -0,0 +1,183 @@
+"""
+Incremental regrading for INVSC — only loops that changed go back to GPT.
+
+For every file, the findings for each loop are remembered under a fingerprint
+of the loop's code and annotations and of the method code leading up to it,
+which sets up the state the invariant must hold in. When the file is graded again, loops whose
+fingerprint is already known reuse their stored grade and warnings; only new
+or edited loops are sent to GPT, as an excerpt of the methods that contain
+them. The file's grade is then recomposed from the per-loop grades.
+
+Changes elsewhere (after the loop, or in other methods) do not trigger a
+regrade in this mode.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .cache import DiskCache, cache_key
+from .config import OPENAI_MODEL
+from .gpt_client import (
+    query_loops, number_lines,
+    ANALYSIS_SYSTEM, ANALYSIS_PROMPT, LOOPS_NOTE, JUDGEMENT_SYSTEM, LOOP_JUDGEMENT_PROMPT,
+)
+from .grader import grade_source, compose_grades, PRECHECK_GRADE, PRECHECK_SUMMARY
+from .scanner import find_loops, find_defs, is_unannotated, unannotated_warning
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+
+loop_store = DiskCache("loops")
+
+
+def _enclosing_def(defs: list[dict], loop: dict) -> dict | None:
+    """The innermost method containing the loop, if any."""
+    enclosing = [d for d in defs if d["start"] < loop["start"] and loop["end"] <= d["end"]]
+    return max(enclosing, key=lambda d: d["start"]) if enclosing else None
+
+
+def loop_fingerprint(source_code: str, loop: dict, defs: list[dict] | None = None) -> str:
+    """
+    Fingerprint of a loop's code and annotations, and of the code from the
+    start of its method (or of the file, outside any method) up to the loop,
+    ignoring layout and position.
+    """
+    inner = _enclosing_def(find_defs(source_code) if defs is None else defs, loop)
+    code = " ".join(source_code[inner["start"] if inner else 0:loop["end"]].split())
+    notes = " ".join(" ".join(loop["annotations"]).split())
+    return cache_key("loop", notes, code)
+
+
+def unsupported_options(single_pass: bool = False, votes: int = 1,
+                        cascade: bool = False) -> list[str]:
+    """The grading options requested that incremental mode can't honour, by name."""
+    requested = {"single_pass": single_pass, "votes": votes > 1, "cascade": cascade}
+    return [name for name, on in requested.items() if on]
+
+
+def state_key(path: Path, model: str) -> str:
+    """Where the per-loop findings for one file are kept."""
+    return cache_key(
+        "loops", model, str(path.resolve()),
+        ANALYSIS_SYSTEM, ANALYSIS_PROMPT, LOOPS_NOTE, JUDGEMENT_SYSTEM, LOOP_JUDGEMENT_PROMPT,
+    )
+
+
+def excerpt_for(source_code: str, loops: list[dict]) -> str:
+    """
+    The smallest numbered excerpt that gives GPT the context for these loops:
+    each enclosing method, plus the comment lines just above it.
+    """
+    lines = source_code.splitlines()
+    defs = find_defs(source_code)
+
+    ranges = []
+    for loop in loops:
+        inner = _enclosing_def(defs, loop)
+        if inner is None:
+            return number_lines(source_code)
+        first = inner["line"]
+        while first > 1 and lines[first - 2].strip().startswith(("//", "/*", "*")):
+            first -= 1
+        ranges.append((first, inner["end_line"]))
+
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+
+    return "\n     ...\n".join(
+        number_lines("\n".join(lines[first - 1:last]), first_line=first) for first, last in merged
+    )
+
+
+def grade_incremental(source_code: str, path: Path, api_key: str | None = None,
+                      model: str | None = None, client: OpenAI | None = None,
+                      use_cache: bool = True, use_precheck: bool = True) -> dict:
+    """
+    Grade a file, sending only the loops that changed since its last verdict to GPT.
+
+    Returns a dict with keys: grade, summary, warnings, analysis
+    """
+    mdl = model or OPENAI_MODEL
+    loops = find_loops(source_code)
+    if not loops:
+        return grade_source(source_code, api_key=api_key, model=mdl, client=client,
+                            use_cache=use_cache, use_precheck=use_precheck)
+
+    key = state_key(path, mdl)
+    previous = (loop_store.get(key) if use_cache else None) or {"loops": {}, "summary": ""}
+
+    findings = {}  # loop line -> {"grade", "warnings"}
+    stored = {}    # fingerprint -> {"grade", "warnings" with loop-relative lines}
+    pending = []
+    defs = find_defs(source_code)
+    for loop in loops:
+        fp = loop_fingerprint(source_code, loop, defs)
+        known = previous["loops"].get(fp)
+        if known is None and use_precheck and is_unannotated(loop):
+            warning = unannotated_warning(loop)
+            known = {
+                "grade": PRECHECK_GRADE,
+                "warnings": [{"offset": 0, "severity": warning["severity"],
+                              "message": warning["message"]}],
+            }
+        if known is None:
+            pending.append((loop, fp))
+            continue
+        stored[fp] = known
+        findings[loop["line"]] = {
+            "grade": known["grade"],
+            "warnings": [
+                {
+                    "line": None if w.get("offset") is None else loop["line"] + w["offset"],
+                    "severity": w.get("severity", "warning"),
+                    "message": w.get("message", ""),
+                }
+                for w in known["warnings"]
+            ],
+        }
+
+    summary = previous["summary"] or PRECHECK_SUMMARY
+    analysis = ("No loop needed GPT: unchanged loops reused their previous findings and "
+                "unannotated loops were graded by the static pre-check.")
+    if pending:
+        fresh = query_loops(
+            excerpt_for(source_code, [lp for lp, _ in pending]),
+            [lp["line"] for lp, _ in pending],
+            api_key=api_key, model=mdl, client=client, use_cache=use_cache,
+        )
+        summary, analysis = fresh["summary"], fresh["analysis"]
+        for loop, fp in pending:
+            found = fresh["loops"].get(loop["line"], {"grade": fresh["grade"], "warnings": []})
+            findings[loop["line"]] = found
+            stored[fp] = {
+                "grade": found["grade"],
+                "warnings": [
+                    {
+                        "offset": w["line"] - loop["line"] if isinstance(w.get("line"), int) else None,
+                        "severity": w.get("severity", "warning"),
+                        "message": w.get("message", ""),
+                    }
+                    for w in found["warnings"]
+                ],
+            }
+
+    warnings = [w for f in findings.values() for w in f["warnings"]]
+    warnings.sort(key=lambda w: w.get("line") or 0)
+    result = {
+        "grade": compose_grades([f["grade"] for f in findings.values()]),
+        "summary": summary,
+        "warnings": warnings,
+        "analysis": analysis,
+    }
+
+    if use_cache:
+        loop_store.put(key, {"loops": stored, "summary": summary})
+
+    return result
@@ -0,0 +1,71 @@
+"""
+Run metrics for INVSC — where an invsc run spends its time and its tokens.
+
+A Metrics object collects wall time per phase (reading, grading, actions,
+compiling) and, for every kind of request (analysis, judgement, single-pass),
+the number of requests, their wall time and their prompt/completion tokens.
+Requests find the collector of the run they belong to through a context
+variable, so nothing has to be threaded through the grading functions;
+code that fans out to other threads passes its context along.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+_current: ContextVar["Metrics | None"] = ContextVar("invsc_metrics", default=None)
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: dict[str, float] = {}
+        self.requests: dict[str, dict] = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the enclosed block as phase `name` (repeated phases add up)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def record_request(self, purpose: str, seconds: float, usage=None):
+        with self.lock:
+            entry = self.requests.setdefault(
+                purpose, {"requests": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+            )
+            entry["requests"] += 1
+            entry["seconds"] += seconds
+            if usage is not None:
+                entry["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+                entry["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+    def as_dict(self) -> dict:
+        """The metrics as plain JSON-ready data, times in seconds."""
+        with self.lock:
+            return {
+                "total_seconds": round(time.perf_counter() - self.started, 3),
+                "phases": {name: round(s, 3) for name, s in self.phases.items()},
+                "requests": {purpose: {**entry, "seconds": round(entry["seconds"], 3)}
+                             for purpose, entry in self.requests.items()},
+                "prompt_tokens": sum(e["prompt_tokens"] for e in self.requests.values()),
+                "completion_tokens": sum(e["completion_tokens"] for e in self.requests.values()),
+            }
+
+
+def activate(metrics: Metrics):
+    """Collect everything measured from now on in this context into metrics."""
+    _current.set(metrics)
+
+
+def record_request(purpose: str, seconds: float, usage=None):
+    """Record a finished API request against the active collector, if there is one."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.record_request(purpose, seconds, usage)
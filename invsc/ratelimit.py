@@ -0,0 +1,196 @@
+"""
+Rate limiting and retries for INVSC — keeps throughput just under the API limits.
+
+Every request first takes one unit from a requests-per-minute bucket and its
+estimated token count from a tokens-per-minute bucket. Both buckets start from
+the configured limits and are corrected from the x-ratelimit-* headers of each
+response. Transient failures (429, 5xx, connection errors) are retried with
+jittered exponential backoff, drawing on a process-wide retry budget so a
+sustained outage fails fast instead of retrying forever.
+"""
+
+import random
+import re
+import threading
+import time
+
+from .config import (
+    RATE_LIMIT_RPM, RATE_LIMIT_TPM, MAX_RETRIES, RETRY_BUDGET,
+    BACKOFF_BASE, BACKOFF_MAX,
+)
+
+
+class TokenBucket:
+    """A thread-safe token bucket refilled continuously at capacity per minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def acquire(self, amount: float = 1):
+        """Block until amount is available, then take it."""
+        amount = min(amount, self.capacity)  # a single oversized request must still go through
+        with self.cond:
+            while True:
+                self._refill()
+                now = time.monotonic()
+                if now < self.paused_until:
+                    self.cond.wait(self.paused_until - now)
+                elif self.level >= amount:
+                    self.level -= amount
+                    return
+                else:
+                    self.cond.wait((amount - self.level) * 60 / self.capacity)
+
+    def wait_time(self, amount: float = 1) -> float:
+        """Seconds until amount would be available, without taking it."""
+        amount = min(amount, self.capacity)
+        with self.cond:
+            self._refill()
+            paused = max(0.0, self.paused_until - time.monotonic())
+            return max(paused, (amount - self.level) * 60 / self.capacity)
+
+    def observe(self, limit: float | None, remaining: float | None):
+        """Correct the bucket from what the server says is left."""
+        with self.cond:
+            self._refill()
+            if limit:
+                self.capacity = float(limit)
+            if remaining is not None:
+                self.level = min(self.level, float(remaining))
+            self.cond.notify_all()
+
+    def pause(self, seconds: float):
+        """Hold every caller back for a while (e.g. after a 429)."""
+        with self.cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class RetryBudget:
+    """
+    Caps retries across the whole process: each retry spends one unit and each
+    success earns back a tenth of one, up to the configured maximum.
+    """
+
+    def __init__(self, size: float):
+        self.size = float(size)
+        self.level = float(size)
+        self.lock = threading.Lock()
+
+    def withdraw(self) -> bool:
+        with self.lock:
+            if self.level < 1:
+                return False
+            self.level -= 1
+            return True
+
+    def deposit(self):
+        with self.lock:
+            self.level = min(self.size, self.level + 0.1)
+
+
+# Per minute; a bucket this size never holds anyone back
+UNLIMITED = 1e12
+
+requests_bucket = TokenBucket(RATE_LIMIT_RPM)
+tokens_bucket = TokenBucket(RATE_LIMIT_TPM)
+retry_budget = RetryBudget(RETRY_BUDGET)
+
+
+def lift_limits():
+    """
+    Stop the process-wide buckets from throttling, for a client that keeps
+    limits of its own for each upstream (see router.py).
+    """
+    for bucket in (requests_bucket, tokens_bucket):
+        with bucket.cond:
+            bucket.capacity = bucket.level = UNLIMITED
+            bucket.cond.notify_all()
+
+
+def parse_duration(value: str | None) -> float | None:
+    """Parse OpenAI reset durations like '1s', '6m0s', '250ms' or plain seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total = 0.0
+    matched = False
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        matched = True
+        total += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return total if matched else None
+
+
+def _number(headers, name: str) -> float | None:
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+def observe_headers(headers, requests: TokenBucket | None = None,
+                    tokens: TokenBucket | None = None):
+    """Update the buckets (by default the process-wide ones) from x-ratelimit-* response headers."""
+    if not headers:
+        return
+    requests = requests or requests_bucket
+    tokens = tokens or tokens_bucket
+    requests.observe(_number(headers, "x-ratelimit-limit-requests"),
+                     _number(headers, "x-ratelimit-remaining-requests"))
+    tokens.observe(_number(headers, "x-ratelimit-limit-tokens"),
+                   _number(headers, "x-ratelimit-remaining-tokens"))
+
+
+def backoff_delay(attempt: int, headers=None) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's retry-after."""
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    if headers:
+        retry_after = _number(headers, "retry-after-ms")
+        retry_after = retry_after / 1000 if retry_after is not None else _number(headers, "retry-after")
+        if retry_after is None:
+            retry_after = parse_duration(headers.get("x-ratelimit-reset-requests"))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, BACKOFF_MAX))
+    return delay
+
+
+def call_with_retries(send, tokens: int, retryable):
+    """
+    Run send() under the rate limits, retrying transient failures.
+
+    send must return (response, headers). retryable(exc) decides whether an
+    exception is worth another attempt. The last exception is re-raised once
+    the per-call retries or the shared retry budget run out.
+    """
+    attempt = 0
+    while True:
+        requests_bucket.acquire(1)
+        tokens_bucket.acquire(tokens)
+        try:
+            response, headers = send()
+        except Exception as e:
+            if not retryable(e) or attempt >= MAX_RETRIES or not retry_budget.withdraw():
+                raise
+            headers = getattr(getattr(e, "response", None), "headers", None)
+            observe_headers(headers)
+            delay = backoff_delay(attempt, headers)
+            if getattr(e, "status_code", None) == 429:
+                requests_bucket.pause(delay)
+            time.sleep(delay)
+            attempt += 1
+            continue
+
+        observe_headers(headers)
+        retry_budget.deposit()
+        return response
@@ -0,0 +1,283 @@
+"""
+Endpoint router for INVSC — one client in front of several OpenAI-compatible endpoints.
+
+With INVSC_BACKEND=router, every chat completion goes to whichever endpoint
+listed in INVSC_ENDPOINTS should answer it soonest. The list is JSON (inline
+or in a file), one object per endpoint:
+
+    [{"name": "openai", "base_url": "https://api.openai.com/v1",
+      "api_key_env": "OPENAI_API_KEY", "weight": 2, "capacity": 16,
+      "rpm": 500, "tpm": 30000},
+     {"name": "lab-1", "base_url": "http://lab-1:8000/v1", "api_key": "none",
+      "capacity": 4, "model": "qwen2.5-coder-32b"}]
+
+base_url may be replaced by "backend" to use a registered backend (e.g.
+"simulated"). weight is the endpoint's relative speed, capacity how many
+requests it may have in flight, and model renames the requested model, as
+a string for every request or as {"requested": "served"}.
+
+For every endpoint the router keeps moving averages of its latency and
+error rate. A request goes to the endpoint with a free slot whose expected
+wait, latency * (in flight + 1) / weight inflated by its error rate, is
+lowest. An endpoint that fails ROUTER_TRIP_FAILURES times in a row, or
+answers 429, is taken out of rotation for a cooldown. A request that hits a
+transient error fails over to the next best endpoint straight away; only
+when every endpoint has failed is the error passed on to ratelimit.py to
+be retried after a backoff.
+
+Every endpoint has rate limits of its own: rpm and tpm if given, else
+INVSC_RPM and INVSC_TPM, corrected from the x-ratelimit-* headers of its
+own responses. A request waits for the quota of the endpoint it goes to,
+and an endpoint whose quota is spent looks as slow as the wait. With the
+router in place the process-wide limits in ratelimit.py are lifted, so
+throughput grows with every endpoint added.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from . import ratelimit
+from .backends import create_backend
+from .config import (
+    ENDPOINTS, ROUTER_SMOOTHING, ROUTER_TRIP_FAILURES, ROUTER_COOLDOWN,
+    RATE_LIMIT_RPM, RATE_LIMIT_TPM,
+)
+from .gpt_client import is_transient, estimate_tokens
+from .ratelimit import TokenBucket, observe_headers
+
+
+class Endpoint:
+    """One upstream and what the router has learned about it."""
+
+    def __init__(self, name: str, client, weight: float = 1, capacity: int = 8,
+                 model: str | dict | None = None, rpm: float | None = None,
+                 tpm: float | None = None):
+        self.name = name
+        self.client = client
+        self.weight = float(weight)
+        self.capacity = max(1, int(capacity))
+        self.model = model
+        self.requests_bucket = TokenBucket(rpm or RATE_LIMIT_RPM)
+        self.tokens_bucket = TokenBucket(tpm or RATE_LIMIT_TPM)
+        self.latency = None       # moving average, seconds
+        self.error_rate = 0.0     # moving average of failed requests
+        self.inflight = 0
+        self.failures = 0         # transient failures in a row
+        self.trips = 0            # cooldowns in a row
+        self.down_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    def model_for(self, requested: str | None) -> str | None:
+        if isinstance(self.model, str):
+            return self.model
+        if isinstance(self.model, dict):
+            return self.model.get(requested, requested)
+        return requested
+
+    def expected_wait(self, default_latency: float, tokens: int) -> float:
+        latency = self.latency if self.latency is not None else default_latency
+        quota = max(self.requests_bucket.wait_time(1), self.tokens_bucket.wait_time(tokens))
+        return quota + latency * (self.inflight + 1) / self.weight / max(0.05, 1 - self.error_rate)
+
+
+class Router:
+    """An OpenAI-shaped client that spreads requests over endpoints (see the module docstring)."""
+
+    def __init__(self, endpoints: list[Endpoint]):
+        if not endpoints:
+            raise ValueError("the router needs at least one endpoint")
+        self.endpoints = endpoints
+        self.cond = threading.Condition()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def close(self):
+        for endpoint in self.endpoints:
+            try:
+                endpoint.client.close()
+            except Exception:
+                pass
+
+    def stats(self) -> list[dict]:
+        """What the router currently knows about each endpoint."""
+        now = time.monotonic()
+        with self.cond:
+            return [
+                {
+                    "name": e.name,
+                    "requests": e.requests,
+                    "errors": e.errors,
+                    "in_flight": e.inflight,
+                    "latency": None if e.latency is None else round(e.latency, 3),
+                    "error_rate": round(e.error_rate, 3),
+                    "down_for": round(max(0.0, e.down_until - now), 1),
+                }
+                for e in self.endpoints
+            ]
+
+    def _acquire(self, exclude: list[Endpoint], tokens: int) -> Endpoint | None:
+        """
+        Take a slot on the best endpoint not in exclude, waiting for one if
+        all are busy, then wait for the endpoint's quota of a request of
+        this many tokens.
+        """
+        endpoint = self._take_slot(exclude, tokens)
+        if endpoint is not None:
+            endpoint.requests_bucket.acquire(1)
+            endpoint.tokens_bucket.acquire(tokens)
+        return endpoint
+
+    def _take_slot(self, exclude: list[Endpoint], tokens: int) -> Endpoint | None:
+        with self.cond:
+            while True:
+                candidates = [e for e in self.endpoints if e not in exclude]
+                if not candidates:
+                    return None
+                now = time.monotonic()
+                up = [e for e in candidates if e.down_until <= now]
+                if not up:
+                    # Everything left is cooling down: probe the one that recovers first
+                    soonest = min(e.down_until for e in candidates)
+                    up = [e for e in candidates if e.down_until == soonest]
+                free = [e for e in up if e.inflight < e.capacity]
+                if free:
+                    measured = [e.latency for e in self.endpoints if e.latency is not None]
+                    default = min(measured) if measured else 1.0
+                    best = min(free, key=lambda e: e.expected_wait(default, tokens))
+                    best.inflight += 1
+                    return best
+                # Wait for a slot to free up, or for an endpoint's cooldown to end
+                resting = [e.down_until - now for e in candidates if e.down_until > now]
+                self.cond.wait(min(resting) if resting else None)
+
+    def _release(self, endpoint: Endpoint, seconds: float | None = None,
+                 error: Exception | None = None):
+        """
+        Free the slot and learn from the outcome: a success (seconds), a
+        transient failure (error), or neither for a request the endpoint
+        isn't to blame for.
+        """
+        a = ROUTER_SMOOTHING
+        with self.cond:
+            endpoint.inflight -= 1
+            if seconds is not None:
+                endpoint.requests += 1
+                endpoint.latency = seconds if endpoint.latency is None else (
+                    (1 - a) * endpoint.latency + a * seconds)
+                endpoint.error_rate *= 1 - a
+                endpoint.failures = endpoint.trips = 0
+                endpoint.down_until = 0.0
+            elif error is not None:
+                endpoint.requests += 1
+                endpoint.errors += 1
+                endpoint.error_rate = (1 - a) * endpoint.error_rate + a
+                endpoint.failures += 1
+                rate_limited = getattr(error, "status_code", None) == 429
+                if rate_limited or endpoint.failures >= ROUTER_TRIP_FAILURES:
+                    headers = getattr(getattr(error, "response", None), "headers", None)
+                    cooldown = min(ROUTER_COOLDOWN * 2 ** endpoint.trips, ROUTER_COOLDOWN * 8)
+                    if rate_limited:
+                        cooldown = ratelimit.backoff_delay(endpoint.trips, headers)
+                    endpoint.down_until = time.monotonic() + cooldown
+                    endpoint.trips += 1
+                    endpoint.failures = 0
+            self.cond.notify_all()
+
+    def create(self, **kwargs):
+        tokens = estimate_tokens(kwargs["messages"])
+        tried = []
+        last_error = None
+        while True:
+            endpoint = self._acquire(tried, tokens)
+            if endpoint is None:
+                raise last_error  # every endpoint failed; ratelimit.py backs off and retries
+            start = time.perf_counter()
+            try:
+                response = self._send(endpoint, {**kwargs, "model": endpoint.model_for(kwargs.get("model"))})
+            except Exception as e:
+                if not is_transient(e):
+                    self._release(endpoint)
+                    raise
+                headers = getattr(getattr(e, "response", None), "headers", None)
+                observe_headers(headers, endpoint.requests_bucket, endpoint.tokens_bucket)
+                self._release(endpoint, error=e)
+                tried.append(endpoint)
+                last_error = e
+                continue
+
+            if kwargs.get("stream"):
+                return self._stream(endpoint, response, start)
+            self._release(endpoint, seconds=time.perf_counter() - start)
+            return response
+
+    @staticmethod
+    def _send(endpoint: Endpoint, kwargs: dict):
+        """One request to one endpoint, keeping its quota in step with its rate limit headers."""
+        completions = endpoint.client.chat.completions
+        raw_api = getattr(completions, "with_raw_response", None)
+        if raw_api is None:
+            return completions.create(**kwargs)
+        raw = raw_api.create(**kwargs)
+        observe_headers(raw.headers, endpoint.requests_bucket, endpoint.tokens_bucket)
+        return raw.parse()
+
+    def _stream(self, endpoint: Endpoint, stream, start: float):
+        """Pass the chunks through, keeping the endpoint's slot until the stream ends."""
+        error = None
+        try:
+            yield from stream
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if error is not None and is_transient(error):
+                self._release(endpoint, error=error)
+            elif error is not None:
+                self._release(endpoint)
+            else:
+                self._release(endpoint, seconds=time.perf_counter() - start)
+
+
+def load_endpoints(spec: str) -> list[dict]:
+    """INVSC_ENDPOINTS: a JSON list of endpoints, or the path of a file holding one."""
+    text = spec.strip()
+    if not text.startswith("["):
+        text = Path(text).expanduser().read_text(encoding="utf-8")
+    entries = json.loads(text)
+    if not isinstance(entries, list) or not all(isinstance(e, dict) for e in entries):
+        raise ValueError("INVSC_ENDPOINTS must be a JSON list of objects")
+    for entry in entries:
+        if "base_url" not in entry and "backend" not in entry:
+            raise ValueError(f"endpoint {entry} has neither a base_url nor a backend")
+    return entries
+
+
+def build_router(api_key: str) -> Router:
+    """The router for INVSC_ENDPOINTS; endpoints without a key of their own use api_key."""
+    from .session import build_client
+
+    if not ENDPOINTS:
+        raise ValueError("INVSC_BACKEND=router needs INVSC_ENDPOINTS (see router.py)")
+    entries = load_endpoints(ENDPOINTS)
+
+    endpoints = []
+    for entry in entries:
+        key = entry.get("api_key") or os.environ.get(entry.get("api_key_env", ""), "") or api_key
+        if "backend" in entry:
+            client = create_backend(entry["backend"], key)
+        else:
+            # Local servers often want no key, but the SDK insists on one
+            client = build_client(key or "none", base_url=entry["base_url"])
+        endpoints.append(Endpoint(
+            entry.get("name") or entry.get("base_url") or entry["backend"], client,
+            weight=entry.get("weight", 1), capacity=entry.get("capacity", 8),
+            model=entry.get("model"), rpm=entry.get("rpm"), tpm=entry.get("tpm"),
+        ))
+
+    # The endpoints enforce their own limits from here on
+    ratelimit.lift_limits()
+    return Router(endpoints)
@@ -0,0 +1,331 @@
+"""
+Static pre-check for INVSC — a fast local scan of Scala loops and their annotations.
+
+The scanner finds every `while` and `do ... while` loop, then collects the
+comments placed before the loop (between it and the previous loop or the
+start of the enclosing block) or inside its body. Comments after a loop never
+count, matching the grading rubric. Students abbreviate freely (`Inv:`, `I:`,
+`Var:`, "bound function", ...), so only a loop with no such comment at all is
+treated as certainly unannotated; anything else is left for the LLM to judge.
+
+`for` comprehensions are not checked: they iterate over a range and are not
+expected to carry invariants in the Imperative Programming course.
+"""
+
+import bisect
+import re
+
+
+INVARIANT_RE = re.compile(r"(?i:\binv(?:ariants?)?\b)|(?:^|[\s/*])[IJ]\d?\s*:")
+VARIANT_RE = re.compile(
+    r"(?i:\bvar\s*:|\bvariants?\b|\bbound(?:\s+function)?\s*:|\btermination\s+measure\b|\bdecreases\b)"
+)
+LOOP_RE = re.compile(r"\b(while|do)\b")
+DEF_RE = re.compile(r"\bdef\b")
+PACKAGE_RE = re.compile(r"^\s*package\s+([\w.]+)\s*$", re.MULTILINE)
+OBJECT_RE = re.compile(r"\bobject\s+(\w+)")
+MAIN_DEF_RE = re.compile(r"\bdef\s+main\s*\(|\bextends\s+App\b")
+MAIN_ANNOTATION_RE = re.compile(r"@main\s+def\s+(\w+)")
+
+
+def lex(source: str) -> tuple[str, list[dict]]:
+    """
+    Split the source into code and comments.
+
+    Returns (mask, comments) where mask is the source with every comment and
+    string literal blanked out (newlines kept, so offsets and line numbers are
+    unchanged) and comments is a list of {"start", "end", "text"} dicts.
+    """
+    mask = list(source)
+    comments = []
+    n = len(source)
+    i = 0
+
+    def blank(a: int, b: int):
+        for k in range(a, b):
+            if mask[k] != "\n":
+                mask[k] = " "
+
+    while i < n:
+        ch = source[i]
+        nxt = source[i + 1] if i + 1 < n else ""
+
+        if ch == "/" and nxt == "/":
+            end = source.find("\n", i)
+            end = n if end == -1 else end
+            comments.append({"start": i, "end": end, "text": source[i:end]})
+            blank(i, end)
+            i = end
+        elif ch == "/" and nxt == "*":
+            # Scala block comments nest
+            depth = 0
+            j = i
+            while j < n:
+                if source.startswith("/*", j):
+                    depth += 1
+                    j += 2
+                elif source.startswith("*/", j):
+                    depth -= 1
+                    j += 2
+                    if depth == 0:
+                        break
+                else:
+                    j += 1
+            comments.append({"start": i, "end": j, "text": source[i:j]})
+            blank(i, j)
+            i = j
+        elif source.startswith('"""', i):
+            end = source.find('"""', i + 3)
+            end = n if end == -1 else end + 3
+            blank(i, end)
+            i = end
+        elif ch == '"':
+            j = i + 1
+            while j < n and source[j] != '"' and source[j] != "\n":
+                j += 2 if source[j] == "\\" else 1
+            end = min(j + 1, n)
+            blank(i, end)
+            i = end
+        elif ch == "'":
+            m = re.match(r"'(\\.[^']*|[^'\\\n])'", source[i:i + 12])
+            if m:
+                blank(i, i + m.end())
+                i += m.end()
+            else:
+                i += 1  # a Scala symbol like 'foo
+        else:
+            i += 1
+
+    return "".join(mask), comments
+
+
+def _match_close(mask: str, pos: int) -> int:
+    """Given the offset of an opening bracket, return the offset just past its match."""
+    pairs = {"(": ")", "{": "}", "[": "]"}
+    stack = []
+    for j in range(pos, len(mask)):
+        ch = mask[j]
+        if ch in pairs:
+            stack.append(pairs[ch])
+        elif stack and ch == stack[-1]:
+            stack.pop()
+            if not stack:
+                return j + 1
+    return len(mask)
+
+
+def _skip_space(mask: str, pos: int) -> int:
+    while pos < len(mask) and mask[pos].isspace():
+        pos += 1
+    return pos
+
+
+def _statement_end(mask: str, pos: int) -> int:
+    """End of a brace-less loop body: the first newline or ';' outside brackets."""
+    depth = 0
+    for j in range(pos, len(mask)):
+        ch = mask[j]
+        if ch in "([{":
+            depth += 1
+        elif ch in ")]}":
+            if depth == 0:
+                return j
+            depth -= 1
+        elif ch in "\n;" and depth == 0:
+            return j
+    return len(mask)
+
+
+def _body_end(mask: str, pos: int) -> int:
+    pos = _skip_space(mask, pos)
+    if pos < len(mask) and mask[pos] == "{":
+        return _match_close(mask, pos)
+    return _statement_end(mask, pos)
+
+
+def _block_pairs(mask: str) -> list[tuple[int, int]]:
+    """Every matched {...} block as (open offset, close offset)."""
+    pairs = []
+    stack = []
+    for j, ch in enumerate(mask):
+        if ch == "{":
+            stack.append(j)
+        elif ch == "}" and stack:
+            pairs.append((stack.pop(), j))
+    return pairs
+
+
+def _line_index(source: str):
+    """Return a function mapping an offset in source to its 1-based line number."""
+    line_starts = [0] + [m.end() for m in re.finditer("\n", source)]
+
+    def line_of(pos: int) -> int:
+        return bisect.bisect_right(line_starts, pos)
+
+    return line_of
+
+
+def find_defs(source: str) -> list[dict]:
+    """
+    Find every method definition that has a body.
+
+    Each def is a dict with keys: start, end, line, end_line.
+    """
+    mask, _ = lex(source)
+    line_of = _line_index(source)
+
+    defs = []
+    for m in DEF_RE.finditer(mask):
+        # Walk the signature to the `=` (or procedure-syntax `{`) that starts the body
+        depth = 0
+        body = None
+        for j in range(m.end(), len(mask)):
+            ch = mask[j]
+            if ch in "([":
+                depth += 1
+            elif ch in ")]":
+                depth -= 1
+            elif depth == 0 and ch == "{":
+                body = j
+                break
+            elif depth == 0 and ch == "=" and mask[j + 1:j + 2] not in ("=", ">"):
+                body = _skip_space(mask, j + 1)
+                break
+            elif depth == 0 and ch in ";}":
+                break
+        if body is None or body >= len(mask):
+            continue
+        end = _body_end(mask, body)
+        defs.append({
+            "start": m.start(),
+            "end": end,
+            "line": line_of(m.start()),
+            "end_line": line_of(max(m.start(), end - 1)),
+        })
+    return defs
+
+
+def find_loops(source: str) -> list[dict]:
+    """
+    Find every while / do-while loop and the annotations that belong to it.
+
+    Each loop is a dict with keys: kind, line, end_line, start, end, invariant,
+    variant and annotations (the comment texts counted for the loop).
+    """
+    mask, comments = lex(source)
+    line_of = _line_index(source)
+
+    loops = []
+    consumed = set()  # offsets of `while` keywords that close a do-while
+    for m in LOOP_RE.finditer(mask):
+        if m.start() in consumed:
+            continue
+        kind = m.group(1)
+        if kind == "while":
+            cond = _skip_space(mask, m.end())
+            if cond >= len(mask) or mask[cond] != "(":
+                continue
+            body_start = _match_close(mask, cond)
+            end = _body_end(mask, body_start)
+        else:
+            body_start = m.end()
+            body_end = _body_end(mask, body_start)
+            tail = re.compile(r"\s*while\b").match(mask, body_end)
+            if not tail:
+                continue
+            consumed.add(tail.end() - len("while"))
+            cond = _skip_space(mask, tail.end())
+            end = _match_close(mask, cond) if cond < len(mask) and mask[cond] == "(" else tail.end()
+        loops.append({
+            "kind": kind,
+            "start": m.start(),
+            "body_start": body_start,
+            "end": end,
+            "line": line_of(m.start()),
+            "end_line": line_of(max(m.start(), end - 1)),
+        })
+
+    blocks = _block_pairs(mask)
+    for loop in loops:
+        # The annotation region before a loop starts at its enclosing block,
+        # or just after the previous loop in that block
+        enclosing = max((o for o, c in blocks if o < loop["start"] < c), default=-1)
+        region_start = enclosing + 1
+        for other in loops:
+            if region_start <= other["end"] <= loop["start"]:
+                region_start = other["end"]
+
+        nested = [(o["start"], o["end"]) for o in loops
+                  if loop["start"] < o["start"] and o["end"] <= loop["end"]]
+
+        annotations = []
+        for com in comments:
+            before = region_start <= com["start"] < loop["start"]
+            inside = loop["body_start"] <= com["start"] < loop["end"] and not any(
+                a <= com["start"] < b for a, b in nested
+            )
+            if before or inside:
+                annotations.append(com["text"])
+
+        loop["annotations"] = annotations
+        loop["invariant"] = any(INVARIANT_RE.search(t) for t in annotations)
+        loop["variant"] = any(VARIANT_RE.search(t) for t in annotations)
+
+    return loops
+
+
+def find_main(source: str) -> str | None:
+    """
+    Return the fully qualified name of the program's entry point: the first
+    top-level object with a main method (or extending App), else the first
+    Scala 3 @main method. None if there is neither.
+    """
+    mask, _ = lex(source)
+    package = PACKAGE_RE.search(mask)
+    prefix = f"{package.group(1)}." if package else ""
+
+    for m in OBJECT_RE.finditer(mask):
+        if mask.count("{", 0, m.start()) != mask.count("}", 0, m.start()):
+            continue  # nested inside something else
+        body = mask.find("{", m.end())
+        if body != -1 and MAIN_DEF_RE.search(mask, m.end(), _match_close(mask, body)):
+            return prefix + m.group(1)
+
+    m = MAIN_ANNOTATION_RE.search(mask)
+    return prefix + m.group(1) if m else None
+
+
+def unannotated_warning(loop: dict) -> dict:
+    """The warning reported for a loop with no annotations, in print_warnings shape."""
+    return {
+        "line": loop["line"],
+        "severity": "error",
+        "message": f"This {loop['kind']} loop has no invariant or variant annotation.",
+    }
+
+
+def is_unannotated(loop: dict) -> bool:
+    """True when no comment at all sits before or inside the loop."""
+    return not loop["annotations"]
+
+
+def precheck(source: str, loops: list[dict] | None = None) -> dict:
+    """
+    Scan the source (or only the given loops) and summarise what the LLM still
+    needs to judge.
+
+    Returns a dict with keys:
+      loops       — every loop found (see find_loops)
+      unannotated — loops with no comment before or inside them
+      warnings    — one warning per unannotated loop, in print_warnings shape
+      certain     — True when every loop is unannotated, so the grade is known
+    """
+    loops = find_loops(source) if loops is None else loops
+    unannotated = [lp for lp in loops if is_unannotated(lp)]
+
+    return {
+        "loops": loops,
+        "unannotated": unannotated,
+        "warnings": [unannotated_warning(lp) for lp in unannotated],
+        "certain": bool(loops) and len(unannotated) == len(loops),
+    }
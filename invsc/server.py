@@ -0,0 +1,324 @@
+"""
+Grading server for INVSC — `invsc serve` grades submissions over HTTP.
+
+An autograder that starts a new invsc process per submission pays every
+time for interpreter startup, imports and a fresh OpenAI client. The server
+keeps one process warm instead: the pooled client, the verdict caches, the
+rate limiter and the fsc compile server are shared by every request.
+
+    POST /grade   {"source": "..."} or {"path": "..."} -> the --json result
+    GET  /health  -> {"status": "ok", "running": n, "queued": n}
+
+At most --jobs submissions are graded at once and at most --queue more may
+wait for a slot; anything beyond that is turned away with 503 so the client
+can retry later.
+
+Requests can only name a path (and a compile output directory) inside the
+directory given with --root, relative to it; without --root only source is
+accepted, so a client can't make the server read or write anywhere it likes.
+"""
+
+import argparse
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from .config import (
+    COLORS, PASSING_GRADES, OPENAI_API_KEY, BATCH_CONCURRENCY,
+    SERVE_HOST, SERVE_PORT, SERVE_QUEUE, SERVE_ROOT, VOTES, CASCADE_MODEL,
+)
+from .gpt_client import GPTError
+from .grader import grade_source
+from .batch import grade_file
+from .incremental import unsupported_options
+from .compiler import compile_captured
+from .session import get_client, needs_api_key
+
+
+class ServerBusy(Exception):
+    """Every grading slot is taken and the queue is full."""
+
+
+class GradingService:
+    """Grades submissions with bounded concurrency, sharing one client across them."""
+
+    def __init__(self, api_key: str | None, model: str | None, jobs: int, queue: int,
+                 use_cache: bool = True, use_precheck: bool = True, single_pass: bool = False,
+                 compiler: str | None = None, out_dir: Path | None = None, votes: int = 1,
+                 cascade: bool = False, cheap_model: str | None = None,
+                 root: Path | None = None):
+        key = api_key or OPENAI_API_KEY
+        self.client = get_client(key) if key or not needs_api_key() else None
+        self.model = model
+        self.use_cache = use_cache
+        self.use_precheck = use_precheck
+        self.single_pass = single_pass
+        self.votes = votes
+        self.cascade = cascade
+        self.cheap_model = cheap_model
+        self.compiler = compiler
+        self.out_dir = out_dir
+        self.root = root.resolve() if root is not None else None
+        self.slots = threading.Semaphore(max(1, jobs))
+        self.admitted = threading.Semaphore(max(1, jobs) + max(0, queue))
+        self.lock = threading.Lock()
+        self.running = 0
+        self.queued = 0
+
+    def _inside_root(self, name: str, what: str) -> Path:
+        """A path from a request, resolved against --root, which it may not leave."""
+        if self.root is None:
+            raise ValueError(f"this server accepts no '{what}' (start it with --root to allow paths)")
+        if not isinstance(name, str):
+            raise ValueError(f"'{what}' must be a string")
+        path = (self.root / name).resolve()
+        if not path.is_relative_to(self.root):
+            raise ValueError(f"'{what}' must be inside the server's root: '{name}'")
+        return path
+
+    def health(self) -> dict:
+        with self.lock:
+            return {"status": "ok", "running": self.running, "queued": self.queued}
+
+    def grade(self, request: dict) -> dict:
+        """
+        Grade one submission. Raises ValueError for a malformed request,
+        ServerBusy when the queue is full and GPTError when grading fails.
+        """
+        source = request.get("source")
+        path = request.get("path")
+        if not isinstance(source, str) and not isinstance(path, str):
+            raise ValueError("expected a 'source' or a 'path' string")
+        if (request.get("incremental") or request.get("check_first")
+                or request.get("compile")) and not isinstance(path, str):
+            raise ValueError("'incremental', 'check_first' and 'compile' need a 'path'")
+        if request.get("incremental"):
+            unsupported = unsupported_options(
+                request.get("single_pass", self.single_pass), int(request.get("votes", self.votes)),
+                bool(request.get("cascade", self.cascade)),
+            )
+            if unsupported:
+                raise ValueError("'incremental' cannot be combined with "
+                                 + ", ".join(f"'{name}'" for name in unsupported))
+        source_path = out_dir = None
+        if not isinstance(source, str):
+            source_path = self._inside_root(path, "path")
+            if request.get("output"):
+                out_dir = self._inside_root(request["output"], "output")
+
+        if not self.admitted.acquire(blocking=False):
+            raise ServerBusy("the grading queue is full, try again later")
+        try:
+            with self.lock:
+                self.queued += 1
+            with self.slots:
+                with self.lock:
+                    self.queued -= 1
+                    self.running += 1
+                try:
+                    return self._grade(request, source, source_path, out_dir)
+                finally:
+                    with self.lock:
+                        self.running -= 1
+        finally:
+            self.admitted.release()
+
+    def _grade(self, request: dict, source: str | None, source_path: Path | None,
+               out_dir: Path | None) -> dict:
+        options = {
+            "model": request.get("model", self.model),
+            "use_cache": request.get("use_cache", self.use_cache),
+            "use_precheck": request.get("precheck", self.use_precheck),
+            "votes": int(request.get("votes", self.votes)),
+            "cascade": bool(request.get("cascade", self.cascade)),
+            "cheap_model": request.get("cheap_model", self.cheap_model),
+        }
+        single_pass = request.get("single_pass", self.single_pass)
+
+        if isinstance(source, str):
+            if not source.strip():
+                raise GPTError("the source is empty")
+            result = grade_source(source, client=self.client, single_pass=single_pass, **options)
+        else:
+            if not source_path.is_file():
+                raise ValueError(f"no such file: '{request['path']}'")
+            result = grade_file(source_path, self.client, single_pass=single_pass,
+                                incremental=bool(request.get("incremental")),
+                                check_first=bool(request.get("check_first")),
+                                check_compiler=self.compiler, **options)
+
+            if request.get("compile") and (result["grade"] in PASSING_GRADES or request.get("force")):
+                exit_code, output = compile_captured(source_path, out_dir=out_dir or self.out_dir,
+                                                     compiler=self.compiler)
+                result = {**result, "compile": {"exit_code": exit_code, "output": output}}
+
+        return result
+
+
+def make_handler(service: GradingService):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, body: dict, headers: dict | None = None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, service.health())
+            else:
+                self._reply(404, {"error": f"no such endpoint: {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/grade":
+                self._reply(404, {"error": f"no such endpoint: {self.path}"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(request, dict):
+                    raise ValueError("expected a JSON object")
+                self._reply(200, service.grade(request))
+            except ServerBusy as e:
+                self._reply(503, {"error": str(e)}, {"Retry-After": "5"})
+            except ValueError as e:
+                self._reply(400, {"error": str(e)})
+            except GPTError as e:
+                self._reply(502, {"error": str(e)})
+            except Exception as e:
+                self._reply(500, {"error": f"internal error: {e}"})
+
+        def log_message(self, format, *args):
+            print(f"{COLORS['info']}[INVSC] {self.address_string()} "
+                  f"{format % args}{COLORS['reset']}", file=sys.stderr)
+
+    return Handler
+
+
+def parse_serve_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="invsc serve",
+        description="Grade Scala submissions over HTTP from one long-running process.",
+    )
+
+    parser.add_argument(
+        "--host",
+        type=str,
+        default=SERVE_HOST,
+        help=f"Address to listen on (default: {SERVE_HOST}, or set INVSC_HOST)",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=SERVE_PORT,
+        help=f"Port to listen on (default: {SERVE_PORT}, or set INVSC_PORT)",
+    )
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=BATCH_CONCURRENCY,
+        help=f"Number of submissions graded at once (default: {BATCH_CONCURRENCY}, or set INVSC_JOBS)",
+    )
+    parser.add_argument(
+        "--queue",
+        type=int,
+        default=SERVE_QUEUE,
+        help=f"Number of submissions that may wait for a slot (default: {SERVE_QUEUE}, or set INVSC_QUEUE)",
+    )
+    parser.add_argument(
+        "--api-key",
+        type=str,
+        default=None,
+        help="OpenAI API key (or set OPENAI_API_KEY env var)",
+    )
+    parser.add_argument(
+        "--model",
+        type=str,
+        default=None,
+        help="Default OpenAI model (default: gpt-4o)",
+    )
+    parser.add_argument(
+        "--root",
+        type=Path,
+        default=Path(SERVE_ROOT) if SERVE_ROOT else None,
+        help="Directory that request paths and outputs are relative to and confined to; "
+             "without it, only source is accepted (or set INVSC_SERVE_ROOT)",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="Default output directory for compiled files (default: parent directory of each source file)",
+    )
+    parser.add_argument(
+        "--compiler",
+        type=str,
+        default="fsc",
+        help="Scala Compiler to use (default: fsc)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignore cached verdicts unless a request asks for them",
+    )
+    parser.add_argument(
+        "--no-precheck",
+        action="store_true",
+        help="Always ask GPT unless a request asks for the static loop scan",
+    )
+    parser.add_argument(
+        "--single-pass",
+        action="store_true",
+        help="Grade in one request unless a request asks otherwise",
+    )
+    parser.add_argument(
+        "--cascade",
+        action="store_true",
+        help="Grade with a cheap model first unless a request asks otherwise",
+    )
+    parser.add_argument(
+        "--cheap-model",
+        type=str,
+        default=None,
+        help=f"Default model for the first tier of --cascade (default: {CASCADE_MODEL}, "
+             f"or set INVSC_CASCADE_MODEL)",
+    )
+    parser.add_argument(
+        "--votes",
+        type=int,
+        default=VOTES,
+        help=f"Verdicts drawn per submission unless a request asks otherwise "
+             f"(default: {VOTES}, or set INVSC_VOTES)",
+    )
+
+    return parser.parse_args(argv)
+
+
+def serve_main(argv: list[str]):
+    args = parse_serve_args(argv)
+    c = COLORS
+
+    service = GradingService(args.api_key, args.model, args.jobs, args.queue,
+                             use_cache=not args.no_cache, use_precheck=not args.no_precheck,
+                             single_pass=args.single_pass, compiler=args.compiler,
+                             out_dir=args.output, votes=args.votes,
+                             cascade=args.cascade, cheap_model=args.cheap_model,
+                             root=args.root)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    server.daemon_threads = True
+
+    print(f"{c['info']}[INVSC] Serving on http://{args.host}:{server.server_port} "
+          f"({args.jobs} at a time, {args.queue} queued)...{c['reset']}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    sys.exit(0)
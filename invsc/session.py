@@ -0,0 +1,89 @@
+"""
+Client session for INVSC — one pooled, keep-alive OpenAI client per process.
+
+Building an OpenAI client per request means a fresh TLS handshake and TCP
+connection for every file. Instead, clients are created once per API key and
+reused by both grading passes and by batch mode, so repeated requests ride on
+already-open connections.
+
+httpx and openai take most of a second to import, so they are only loaded
+once the first client is actually built.
+
+The client comes from the backend named by INVSC_BACKEND (see backends.py);
+the OpenAI client built here is registered as the "openai" backend, and a
+router over several such clients (see router.py) as "router".
+"""
+
+from __future__ import annotations
+
+import atexit
+import threading
+from typing import TYPE_CHECKING
+
+from .backends import create_backend, register_backend
+from .config import (
+    LLM_BACKEND, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_KEEPALIVE_EXPIRY,
+    HTTP_CONNECT_TIMEOUT, HTTP_TIMEOUT,
+)
+
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+
+_clients: dict[str, OpenAI] = {}
+_lock = threading.Lock()
+
+
+def build_client(api_key: str, base_url: str | None = None) -> OpenAI:
+    """Create an OpenAI client backed by a pooled keep-alive HTTP client."""
+    import httpx
+    from openai import OpenAI
+
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+    )
+    # Retries are handled by ratelimit.py, which also knows about the rate limits
+    return OpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+
+
+def build_router(api_key: str):
+    from .router import build_router
+
+    return build_router(api_key)
+
+
+register_backend("openai", build_client)
+register_backend("router", build_router)
+
+
+def needs_api_key() -> bool:
+    """Whether the configured backend needs an API key (only the real one does)."""
+    return LLM_BACKEND == "openai"
+
+
+def get_client(api_key: str) -> OpenAI:
+    """Return the shared client for this API key, creating it on first use."""
+    with _lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = create_backend(LLM_BACKEND, api_key)
+            _clients[api_key] = client
+        return client
+
+
+@atexit.register
+def close_clients():
+    """Close every pooled connection."""
+    with _lock:
+        for client in _clients.values():
+            try:
+                client.close()
+            except Exception:
+                pass
+        _clients.clear()
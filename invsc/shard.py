@@ -0,0 +1,114 @@
+"""
+Sharding for INVSC — splits large Scala files at method boundaries.
+
+Only methods that contain loops are worth grading, so those are grouped into
+shards of at most SHARD_LINES lines each. Every shard also carries the context
+a reader of those methods needs: the imports, the headers of the enclosing
+objects/classes, their fields and the signatures of the other methods. Lines
+keep their original numbers, so the warnings for each shard already point
+into the original file.
+"""
+
+import re
+
+from .config import SHARD_LINES
+from .gpt_client import number_lines
+from .scanner import lex, find_defs, find_loops
+
+
+CONTAINER_RE = re.compile(r"\b(object|class|trait)\s+\w+")
+
+
+def _context_lines(source_code: str, defs: list[dict]) -> set[int]:
+    """Lines every shard should see: imports, container headers and fields."""
+    mask, _ = lex(source_code)
+    lines = source_code.splitlines()
+    mask_lines = mask.splitlines()
+
+    def in_def(n: int) -> bool:
+        return any(d["line"] <= n <= d["end_line"] for d in defs)
+
+    context = set()
+    for n, text in enumerate(mask_lines, start=1):
+        code = text.strip()
+        if not code or in_def(n):
+            continue
+        if code.startswith(("import ", "package ")) or CONTAINER_RE.search(code):
+            context.add(n)
+        elif re.match(r"(private\s+|protected\s+)?(val|var|type)\b", code):
+            context.add(n)
+
+    # Drop lines that are only closing braces or blank in the original
+    return {n for n in context if lines[n - 1].strip() not in ("", "}")}
+
+
+def split_shards(source_code: str, max_lines: int = SHARD_LINES,
+                 loops: list[dict] | None = None) -> list[dict]:
+    """
+    Split the source into shards of loop-bearing methods, and of loops that
+    sit outside any method.
+
+    Each shard is a dict with keys:
+      first, last — original line range of the methods in the shard
+      loops       — the loops (see scanner.find_loops) inside the shard
+      text        — the numbered shard text, context included
+    """
+    loops = find_loops(source_code) if loops is None else loops
+    defs = find_defs(source_code)
+    lines = source_code.splitlines()
+
+    # Outermost methods only; nested defs travel with their parent
+    top = [d for d in defs
+           if not any(o is not d and o["start"] < d["start"] and d["end"] <= o["end"] for o in defs)]
+
+    units = []
+    for d in sorted(top, key=lambda d: d["start"]):
+        inside = [lp for lp in loops if d["start"] < lp["start"] and lp["end"] <= d["end"]]
+        if not inside:
+            continue
+        first = d["line"]
+        while first > 1 and lines[first - 2].strip().startswith(("//", "/*", "*")):
+            first -= 1
+        units.append({"first": first, "last": d["end_line"], "loops": inside})
+
+    # Loops outside any method (an `object ... extends App` body, script code)
+    # are units of their own, with nested loops travelling with the outermost
+    loose = [lp for lp in loops
+             if not any(d["start"] < lp["start"] and lp["end"] <= d["end"] for d in top)]
+    for lp in loose:
+        if any(o is not lp and o["start"] < lp["start"] and lp["end"] <= o["end"] for o in loose):
+            continue
+        first = lp["line"]
+        while first > 1 and lines[first - 2].strip().startswith(("//", "/*", "*")):
+            first -= 1
+        inside = [o for o in loose if lp["start"] <= o["start"] and o["end"] <= lp["end"]]
+        units.append({"first": first, "last": lp["end_line"], "loops": inside})
+    units.sort(key=lambda u: u["first"])
+
+    shards = []
+    for unit in units:
+        current = shards[-1] if shards else None
+        if current and unit["last"] - current["first"] + 1 <= max_lines:
+            current["last"] = unit["last"]
+            current["loops"] += unit["loops"]
+        else:
+            shards.append(dict(unit))
+
+    # Signatures of the other methods, so calls across shards still make sense
+    context = _context_lines(source_code, defs) | {d["line"] for d in top}
+    for shard in shards:
+        wanted = sorted(
+            {n for n in context if n < shard["first"] or n > shard["last"]}
+            | set(range(shard["first"], shard["last"] + 1))
+        )
+        chunks = []
+        for n in wanted:
+            if chunks and chunks[-1][-1] == n - 1:
+                chunks[-1].append(n)
+            else:
+                chunks.append([n])
+        shard["text"] = "\n     ...\n".join(
+            number_lines("\n".join(lines[c[0] - 1:c[-1]]), first_line=c[0]) for c in chunks
+        )
+
+    return shards